@@ -1,12 +1,13 @@
-import sqlite3
+from db_init import close_all, USERS_DB
+from migrations import migrate
 
+# The is_admin column is a users.db migration now; running this again is harmless
 def alter_users_table():
-    conn = sqlite3.connect('users.db')
-    cursor = conn.cursor()
-    cursor.execute("ALTER TABLE users ADD COLUMN is_admin BOOLEAN NOT NULL DEFAULT 0")
-    conn.commit()
-    conn.close()
-    print("Added 'is_admin' column to 'users' table successfully!")
+    if migrate(USERS_DB):
+        print("Added 'is_admin' column to 'users' table successfully!")
+    else:
+        print("The 'users' table is already up to date.")
+    close_all()
 
 if __name__ == "__main__":
     alter_users_table()
@@ -0,0 +1,273 @@
+import argparse
+import json
+import re
+import sqlite3
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, urlencode
+from db_init import get_connection, close_all, PRODUCTS_DB
+from image_cache import get_image
+from image_store import FORMATS, WIDTHS
+from migrations import migrate
+from perf import span
+from product_management import (
+    get_catalog_version, get_products_page, get_product, get_facet_counts,
+    SORT_ORDERS, DEFAULT_PAGE_SIZE, VERSION_REFRESH_SECONDS
+)
+from product_search import get_search_page
+
+# Read-only JSON view of the catalog for mobile and partner clients, served from products.db next to the
+# Streamlit UI. Every catalog response carries the catalog version as its ETag, so a client revalidating
+# unchanged data gets a 304 for the price of one cached version check
+#
+#   GET /api/products?limit=&after=&sort=&in_stock=1&min_price=&max_price=&color=&size=&q=
+#   GET /api/products/<id>
+#   GET /api/facets?<same filters>
+#   GET /api/images/<key>?width=     format chosen from the Accept header
+#
+# Run it on the host that serves the Streamlit UI, from the same directory so it opens the same products.db:
+#
+#   python api.py [--host 0.0.0.0] [--port 8502]
+#
+# It is not a Procfile process: only the web process is given $PORT and routed traffic, so the API needs
+# its own port exposed on that host
+
+DEFAULT_PORT = 8502
+MAX_PAGE_SIZE = 100
+# Other processes' writes are noticed within VERSION_REFRESH_SECONDS, so catalog JSON is never fresher than that
+CATALOG_MAX_AGE = int(VERSION_REFRESH_SECONDS)
+# Image URLs name the content hash of the image, so a response never changes
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+IMAGE_TYPES = {"jpeg": "image/jpeg", "webp": "image/webp", "avif": "image/avif"}
+IMAGE_KEY = re.compile(r"[0-9a-f]{64}")
+
+
+# Formats to try for a request, best first; JPEG is stored for every image and always acceptable
+def negotiate_formats(accept):
+    accepted = set()
+    for part in (accept or "").split(","):
+        media, *params = [item.strip() for item in part.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(media.lower())
+    return [fmt for fmt in ("avif", "webp") if fmt in FORMATS and IMAGE_TYPES[fmt] in accepted] + ["jpeg"]
+
+
+# The stored width a request is served at, so every width in between shares one cache entry and ETag
+def rendition_width(width):
+    return next((w for w in WIDTHS if w >= width), WIDTHS[-1])
+
+
+# Filter criteria from query parameters, in the form build_filter_clause takes
+def parse_filters(query):
+    def price(name):
+        value = query.get(name, [""])[0]
+        return float(value) if value else None
+    return {
+        "in_stock": query.get("in_stock", [""])[0].lower() in ("1", "true", "yes"),
+        "min_price": price("min_price"),
+        "max_price": price("max_price"),
+        "colors": query.get("color", []),
+        "sizes": query.get("size", []),
+    }
+
+
+# Keyset cursors go over the wire as "id" or, for price orderings, "price:id"
+def format_cursor(cursor):
+    if isinstance(cursor, tuple):
+        return f"{cursor[0]}:{cursor[1]}"
+    return None if cursor is None else str(cursor)
+
+
+def parse_cursor(value, sort):
+    if not value:
+        return None
+    if sort == "default":
+        return int(value)
+    price, _, product_id = value.partition(":")
+    return float(price), int(product_id)
+
+
+def product_json(row):
+    product_id, name, price, available, image_key, description, color, size = row
+    return {
+        "id": product_id,
+        "name": name,
+        "price": price,
+        "available": bool(available),
+        "description": description,
+        "color": color,
+        "size": size,
+        "image": f"/api/images/{image_key}" if image_key else None,
+    }
+
+
+class CatalogHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so a client paging through the catalog reuses one connection
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle's algorithm on, the body then waits for the
+    # client's delayed ACK of the headers, adding about 40 ms to every response with a body
+    disable_nagle_algorithm = True
+    access_log = False
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        parts = url.path.strip("/").split("/")
+        try:
+            if parts == ["api", "products"]:
+                with span("api.products"):
+                    self.products(url.path, query)
+            elif len(parts) == 3 and parts[:2] == ["api", "products"] and parts[2].isdigit():
+                with span("api.product"):
+                    self.product(int(parts[2]))
+            elif parts == ["api", "facets"]:
+                with span("api.facets"):
+                    self.facets(query)
+            elif len(parts) == 3 and parts[:2] == ["api", "images"] and IMAGE_KEY.fullmatch(parts[2]):
+                with span("api.image"):
+                    self.image(parts[2], query)
+            else:
+                self.send_error_json(404, "Not found")
+        except ValueError as e:
+            self.send_error_json(400, f"Bad request: {e}")
+        except sqlite3.OperationalError as e:
+            # Typically a write lock held past the busy timeout; worth retrying shortly
+            self.send_error_json(503, f"Database unavailable: {e}", {"Retry-After": "1"})
+
+    do_HEAD = do_GET
+
+    def products(self, path, query):
+        sort = query.get("sort", ["default"])[0]
+        if sort not in SORT_ORDERS:
+            raise ValueError(f"sort must be one of {', '.join(SORT_ORDERS)}")
+        limit = min(max(int(query.get("limit", [DEFAULT_PAGE_SIZE])[0]), 1), MAX_PAGE_SIZE)
+        filters = parse_filters(query)
+        text = query.get("q", [""])[0].strip()
+        after = query.get("after", [""])[0]
+
+        def body():
+            if text:
+                # Search results are ranked, so they page by number rather than by keyset cursor
+                page = int(after or 0)
+                rows, has_more = get_search_page(conn, text, page, limit, filters, sort)
+                next_cursor = str(page + 1) if has_more else None
+            else:
+                rows, cursor = get_products_page(conn, parse_cursor(after, sort), limit, filters, sort)
+                next_cursor = format_cursor(cursor)
+            next_url = None
+            if next_cursor is not None:
+                next_url = f"{path}?{urlencode(dict(query, after=[next_cursor]), doseq=True)}"
+            return {"products": [product_json(row) for row in rows], "next_cursor": next_cursor, "next": next_url}
+
+        conn = get_connection(PRODUCTS_DB)
+        self.send_catalog_json(conn, body)
+
+    def product(self, product_id):
+        conn = get_connection(PRODUCTS_DB)
+        row = get_product(conn, product_id)
+        if row is None:
+            self.send_error_json(404, f"No product {product_id}")
+            return
+        self.send_catalog_json(conn, lambda: {"product": product_json(row)})
+
+    def facets(self, query):
+        filters = parse_filters(query)
+        conn = get_connection(PRODUCTS_DB)
+        self.send_catalog_json(conn, lambda: {"facets": get_facet_counts(conn, filters)})
+
+    def image(self, key, query):
+        width = rendition_width(int(query.get("width", [WIDTHS[-1]])[0]))
+        formats = negotiate_formats(self.headers.get("Accept"))
+        headers = {"Cache-Control": IMAGE_CACHE_CONTROL, "Vary": "Accept"}
+        # Any rendition the client already holds in a format it accepts is still valid
+        if self.not_modified([f'"{key}-{fmt}-{width}"' for fmt in formats], headers):
+            return
+        conn = get_connection(PRODUCTS_DB)
+        for fmt in formats:
+            data = get_image(conn, key, width, fmt)
+            if data:
+                headers["ETag"] = f'"{key}-{fmt}-{width}"'
+                self.send(200, IMAGE_TYPES[fmt], data, headers)
+                return
+        self.send_error_json(404, f"No image {key}")
+
+    # Answer with the body built by make_body, or 304 when the client has this catalog version;
+    # make_body is only called when the data is actually sent
+    def send_catalog_json(self, conn, make_body):
+        version = get_catalog_version(conn)
+        headers = {"ETag": f'"catalog-{version}"', "Cache-Control": f"public, max-age={CATALOG_MAX_AGE}"}
+        if self.not_modified([headers["ETag"]], headers):
+            return
+        body = dict(make_body(), version=version)
+        self.send(200, "application/json", json.dumps(body, separators=(",", ":")).encode(), headers)
+
+    # Send 304 if If-None-Match names one of the given ETags; returns whether it did
+    def not_modified(self, etags, headers):
+        header = self.headers.get("If-None-Match")
+        if not header:
+            return False
+        sent = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+        matched = [tag for tag in etags if tag in sent or "*" in sent]
+        if not matched:
+            return False
+        self.send(304, None, b"", dict(headers, ETag=matched[0]))
+        return True
+
+    def send_error_json(self, status, message, headers=None):
+        body = json.dumps({"error": message}).encode()
+        self.send(status, "application/json", body, {**(headers or {}), "Cache-Control": "no-store"})
+
+    def send(self, status, content_type, body, headers):
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        # Clients on other origins may read the catalog
+        self.send_header("Access-Control-Allow-Origin", "*")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD" and status != 304:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.access_log:
+            super().log_message(format, *args)
+
+
+# One thread per client connection, each with its own pooled SQLite connection
+def make_server(host="127.0.0.1", port=DEFAULT_PORT, access_log=False):
+    migrate(PRODUCTS_DB)
+    CatalogHandler.access_log = access_log
+    server = ThreadingHTTPServer((host, port), CatalogHandler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the catalog in products.db as read-only JSON.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--access-log", action="store_true", help="log every request to stderr")
+    args = parser.parse_args(argv)
+    server = make_server(args.host, args.port, args.access_log)
+    print(f"Serving the catalog API on http://{args.host}:{server.server_address[1]}/api/products", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        close_all()
+
+
+if __name__ == "__main__":
+    main()
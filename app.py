@@ -1,12 +1,36 @@
 import streamlit as st
-import pandas as pd
-import os
-from PIL import Image
+import inspect
 import io
+import os
+import time
 import sqlite3
-import base64
 from datetime import datetime
 from user_login import login, logout
+import perf
+from perf import span
+from db_init import get_connection, transaction, PRODUCTS_DB
+from image_cache import get_product_image, invalidate_product, image_cache
+from product_management import (
+    bump_catalog_version, catalog_cache_stats,
+    get_products_page, get_product_summaries, get_facet_counts, filters_key, SORT_ORDERS,
+    PAGE_SIZE_OPTIONS, DEFAULT_PAGE_SIZE
+)
+from product_search import get_search_page
+from job_queue import enqueue, job_counts, recent_jobs, latest_job_status, PRODUCT_IMAGE, REENCODE_CATALOG
+from order_management import checkout, set_stock, get_stock, recent_orders
+from cart_store import cart_store
+from migrations import migrate_all
+from cart_management import (
+    init_cart, add_to_cart, remove_from_cart, update_quantity_from_widget, get_cart_lines, clear_cart,
+    prune_cart, quantity_key, MAX_QUANTITY
+)
+
+# Display widths in CSS pixels; each render site asks the image store for the smallest rendition covering
+# its width. st.image passes JPEG bytes through as they are but re-encodes any other format to JPEG, so the
+# app renders the progressive JPEG renditions and the WebP ones are for clients fetching images directly
+CARD_IMAGE_WIDTH = 400
+CART_THUMB_WIDTH = 50
+LOGO_WIDTH = 50
 
 # Set page configuration
 st.set_page_config(
@@ -14,176 +38,308 @@ st.set_page_config(
     page_icon="🛍️",
     layout="wide"
 )
+rerun_started = time.perf_counter()
 
-# Initialize the database connection
+# Apply pending schema migrations once per server process; reruns just take their thread's pooled connection
+@st.cache_resource(show_spinner=False)
 def initialize_db():
     try:
-        conn = sqlite3.connect('products.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS products (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                price REAL NOT NULL,
-                available BOOLEAN NOT NULL,
-                image TEXT,
-                description TEXT,
-                color TEXT,
-                size TEXT
-            )
-        ''')
-        conn.commit()
-        return conn
+        for path, applied in migrate_all().items():
+            if applied:
+                print(f"Applied {len(applied)} migration(s) to {path}")
+        print("Database initialized successfully")
+        return True
     except sqlite3.Error as e:
         print(f"Database error: {e}")
-        return None
+        return False
 
-conn = initialize_db()
-if conn:
-    print("Database initialized successfully")
-else:
-    st.error("Failed to initialize database")
-    st.stop()
-
-# Function to convert image to base64 for storing in the database
-def image_to_base64(img):
-    if img.mode in ("RGBA", "LA"):
-        background = Image.new(img.mode[:-1], img.size, (255, 255, 255))
-        background.paste(img, img.split()[-1])
-        img = background
-    buffered = io.BytesIO()
-    img.save(buffered, format="JPEG")
-    return base64.b64encode(buffered.getvalue()).decode()
+with span("app.initialize_db"):
+    if not initialize_db():
+        # Don't memoize the failure; the next run tries again
+        initialize_db.clear()
+        st.error("Failed to initialize database")
+        st.stop()
+conn = get_connection(PRODUCTS_DB)
 
-# Function to convert base64 to image for displaying
-def base64_to_image(base64_string):
-    return Image.open(io.BytesIO(base64.b64decode(base64_string)))
+# Function to read the CSS file once per process
+@st.cache_resource(show_spinner=False)
+def read_css(file_path):
+    with open(file_path) as f:
+        return f'<style>{f.read()}</style>'
 
 # Function to load CSS from a file
 def load_css(file_path):
-    with open(file_path) as f:
-        st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
+    with span("app.load_css"):
+        st.markdown(read_css(file_path), unsafe_allow_html=True)
 
 # Load CSS
 load_css("styles.css")
 
+# Function to scale the logo to its display width once per process, so st.image can pass
+# the bytes straight through instead of resizing and re-encoding the PNG on every run
+@st.cache_resource(show_spinner=False)
+def read_logo(path, width):
+    if not os.path.exists(path):
+        return None
+    from PIL import Image
+    logo = Image.open(path)
+    logo.thumbnail((width, logo.height))
+    buffered = io.BytesIO()
+    logo.save(buffered, format="PNG")
+    return buffered.getvalue()
+
 # Display the logo using Streamlit's st.image with a very small width and move it up more
 logo_path = os.path.join(os.path.dirname(__file__), 'logo.png')
-if os.path.exists(logo_path):
-    st.markdown("<div style='margin-top: -40px;'></div>", unsafe_allow_html=True)
-    st.image(logo_path, use_container_width=False, width=50)
-else:
-    st.warning("Logo image not found. Please check the path.")
+with span("app.logo"):
+    logo = read_logo(logo_path, LOGO_WIDTH)
+    if logo:
+        st.markdown("<div style='margin-top: -40px;'></div>", unsafe_allow_html=True)
+        st.image(logo, width=LOGO_WIDTH, output_format="PNG")
+    else:
+        st.warning("Logo image not found. Please check the path.")
 
 # Initialize session state variables
 if 'user_logged_in' not in st.session_state:
     st.session_state.user_logged_in = False
 if 'is_admin' not in st.session_state:
     st.session_state.is_admin = False
-if 'cart' not in st.session_state:
-    st.session_state.cart = []
-
-# Function to initialize the shopping cart
-def init_cart():
-    if 'cart' not in st.session_state:
-        st.session_state.cart = []
-
-# Function to add items to the cart
-def add_to_cart(product_id, name, price, image):
-    st.session_state.cart.append({
-        'id': product_id,
-        'name': name,
-        'price': price,
-        'image': image
-    })
-
-# Function to display the shopping cart
-def display_cart():
-    if not st.session_state.cart:
-        st.info("Your cart is empty.")
+init_cart()
+if 'catalog_cursors' not in st.session_state:
+    st.session_state.catalog_cursors = [None]
+
+# Functions to move between catalog pages; the cursor stack holds the position of the last row
+# seen before each page (or the result page number while searching), None for the first page
+def next_catalog_page(cursor):
+    st.session_state.catalog_cursors.append(cursor)
+
+def previous_catalog_page():
+    if len(st.session_state.catalog_cursors) > 1:
+        st.session_state.catalog_cursors.pop()
+
+def reset_catalog_pages():
+    st.session_state.catalog_cursors = [None]
+
+# Start over at the first page whenever the query behind the cursor stack changes. The on_change
+# callbacks above miss changes Streamlit makes itself: widget state is dropped while another page is
+# shown, so search, sort and filters come back at their defaults next to a stack built for the old query
+def sync_catalog_pages(query):
+    if st.session_state.get("catalog_query") != query:
+        st.session_state.catalog_query = query
+        reset_catalog_pages()
+
+# Product cards and the cart panel rerun on their own when their widgets are used,
+# so a click doesn't re-query and re-emit the whole catalog (plain functions on old Streamlit).
+# A fragment rerun runs on a new script thread, so fragments fetch that thread's connection
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda fn: fn)
+# Streamlit versions with @st.fragment(key=...) let one click rerun several named fragments,
+# which "Add to Cart" needs to redraw both its card and the cart panel above the grid
+keyed_fragments = "key" in inspect.signature(fragment).parameters
+CART_FRAGMENT = "cart_panel"
+
+def card_fragment_key(product_id):
+    return f"product_card_{product_id}"
+
+# Callback for the "Add to Cart" buttons; reruns the clicked card, which shows the confirmation, and the
+# cart panel. Without keyed fragments cards are plain functions, so the click reruns the whole app instead
+def add_to_cart_clicked(product_id):
+    add_to_cart(product_id)
+    st.session_state.cart_just_added = product_id
+    if keyed_fragments:
+        st.rerun([CART_FRAGMENT, card_fragment_key(product_id)])
+
+# Function to display one product card as its own fragment when the cart panel can be rerun along with it
+# image_job is the status of the product's latest image job when it has no image yet
+def product_card(product, image_job=None):
+    if keyed_fragments:
+        fragment(key=card_fragment_key(product[0]))(render_product_card)(product, image_job)
     else:
-        for item in st.session_state.cart:
-            col1, col2 = st.columns([1, 4])
-            with col1:
-                st.image(base64_to_image(item['image']), width=50, output_format="JPEG")
-            with col2:
-                st.markdown(f"**{item['name']}**")
-                st.markdown(f"**Price:** {item['price']:.2f} ₮")
-            st.markdown("---")
-
-# Navigation
-page = st.sidebar.selectbox("Navigation", ["Main Page", "Sign Up", "Shopping Cart"])
+        render_product_card(product, image_job)
+
+def render_product_card(product, image_job=None):
+    product_id, name, price, available, image_key, description, color, size = product
+    conn = get_connection(PRODUCTS_DB)
+    with span("app.product_card"):
+        with st.container():
+            st.markdown("<div class='product-card'>", unsafe_allow_html=True)
+            
+            # Display the smallest pre-rendered JPEG that fills the card
+            image = get_product_image(conn, product_id, image_key, CARD_IMAGE_WIDTH)
+            if image:
+                st.image(image, caption="", use_container_width=True, output_format="JPEG")
+            elif image_job == "failed":
+                # The background worker gave up on the upload; the admin can upload it again
+                st.markdown("<div class='product-image product-image-placeholder product-image-failed'>Image upload failed</div>", unsafe_allow_html=True)
+            elif image_job in ("queued", "running"):
+                # A new product's image is still with the background worker
+                st.markdown("<div class='product-image product-image-placeholder'>Image processing…</div>", unsafe_allow_html=True)
+            
+            # Display product information
+            st.markdown(f"### {name}")
+            st.markdown(f"<div class='product-price'>{price:.2f} ₮</div>", unsafe_allow_html=True)
+            
+            availability_class = "available" if available else "unavailable"
+            availability_text = "In Stock" if available else "Out of Stock"
+            st.markdown(f"<div class='product-availability {availability_class}'>{availability_text}</div>", unsafe_allow_html=True)
+            
+            if description:
+                with st.expander("Details"):
+                    st.write(description)
+            
+            if color:
+                st.markdown(f"**Color:** {color}")
+            
+            if size:
+                st.markdown(f"**Size:** {size}")
+            
+            st.markdown("</div>", unsafe_allow_html=True)
+            st.markdown("<br>", unsafe_allow_html=True)
+            
+            if available:
+                st.button(f"Add to Cart", key=f"add_to_cart_{product_id}",
+                          on_click=add_to_cart_clicked, args=(product_id,))
+                if st.session_state.get("cart_just_added") == product_id:
+                    del st.session_state.cart_just_added
+                    st.toast(f"Added {name} to cart!")
+                in_cart = st.session_state.cart.get(product_id)
+                if in_cart:
+                    st.caption(f"✓ {in_cart} in your cart")
+
+# Function to display the shopping cart; names, current prices and thumbnails come from one batched query.
+# Quantity and remove controls rerun only the cart panel
+@(fragment(key=CART_FRAGMENT) if keyed_fragments else fragment)
+def display_cart():
+    conn = get_connection(PRODUCTS_DB)
+    with span("app.cart"):
+        prune_cart(conn)
+        lines, total = get_cart_lines(conn, st.session_state.cart)
+        if not lines:
+            st.info("Your cart is empty.")
+        else:
+            for product_id, name, price, quantity, image_key, available in lines:
+                col1, col2, col3, col4 = st.columns([1, 4, 2, 1])
+                with col1:
+                    thumb = get_product_image(conn, product_id, image_key, CART_THUMB_WIDTH * 2)
+                    if thumb:
+                        st.image(thumb, width=CART_THUMB_WIDTH, output_format="JPEG")
+                with col2:
+                    st.markdown(f"**{name}**")
+                    st.markdown(f"**Price:** {price:.2f} ₮")
+                    if not available:
+                        st.markdown("<div class='product-availability unavailable'>Out of Stock</div>", unsafe_allow_html=True)
+                with col3:
+                    st.number_input("Quantity", min_value=1, max_value=MAX_QUANTITY, value=quantity, step=1,
+                                    key=quantity_key(product_id), on_change=update_quantity_from_widget,
+                                    args=(product_id,))
+                with col4:
+                    st.button("Remove", key=f"cart_remove_{product_id}", on_click=remove_from_cart, args=(product_id,))
+                st.markdown("---")
+            st.markdown(f"**Total:** {total:.2f} ₮")
+
+# Navigation; the Performance page is only offered to admins
+pages = ["Main Page", "Sign Up", "Shopping Cart"]
+if st.session_state.is_admin:
+    pages.append("Performance")
+page = st.sidebar.selectbox("Navigation", pages)
 
 if page == "Main Page":
     # Initialize user login and shopping cart
     login()
-    init_cart()
     display_cart()
 
     # Function to remove a product from the database
     def remove_product(product_id):
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM products WHERE id = ?", (product_id,))
-        conn.commit()
+        with transaction(PRODUCTS_DB) as conn:
+            conn.execute("DELETE FROM products WHERE id = ?", (product_id,))
+            set_stock(conn, product_id, None)
+            bump_catalog_version(conn)
+        invalidate_product(product_id)
         st.success(f"Product {product_id} deleted successfully!")
-        st.experimental_rerun()
+        st.rerun()
 
     # Display products for all users
     st.markdown("<h3 class='main-title'>Hot selling products 🔥🔥🔥</h3>", unsafe_allow_html=True)
 
-    # Get products from the database
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name, price, available, image, description, color, size FROM products")
-    products = cursor.fetchall()
+    # Search box; the last word is matched as a prefix so a partly typed word already finds products
+    search_text = st.text_input("Search products", key="catalog_search",
+                                placeholder="Search by name, description, color or size",
+                                on_change=reset_catalog_pages).strip()
+
+    # Filter sidebar; the criteria compile into the product query and facet counts come from one GROUP BY query
+    st.sidebar.markdown("### Filters")
+    sort_labels = {"default": "Featured", "price_asc": "Price: low to high", "price_desc": "Price: high to low"}
+    sort = st.sidebar.selectbox("Sort by", list(SORT_ORDERS), format_func=sort_labels.get,
+                                key="catalog_sort", on_change=reset_catalog_pages)
+    filters = {
+        "in_stock": st.session_state.get("filter_in_stock", False),
+        "min_price": st.session_state.get("filter_min_price"),
+        "max_price": st.session_state.get("filter_max_price"),
+        "colors": st.session_state.get("filter_colors", []),
+        "sizes": st.session_state.get("filter_sizes", []),
+    }
+    facet_counts = get_facet_counts(conn, filters)
+    # Options come from the unfiltered catalog so they stay put while other filters change
+    all_values = get_facet_counts(conn)
+
+    st.sidebar.checkbox("In stock only", key="filter_in_stock", on_change=reset_catalog_pages)
+    st.sidebar.caption(f"{facet_counts['available'].get(1, 0)} in stock, "
+                       f"{facet_counts['available'].get(0, 0)} out of stock")
+    min_col, max_col = st.sidebar.columns(2)
+    with min_col:
+        st.number_input("Min price (₮)", min_value=0.0, value=None, step=1000.0,
+                        key="filter_min_price", on_change=reset_catalog_pages)
+    with max_col:
+        st.number_input("Max price (₮)", min_value=0.0, value=None, step=1000.0,
+                        key="filter_max_price", on_change=reset_catalog_pages)
+    for facet, label, key in (("color", "Color", "filter_colors"), ("size", "Size", "filter_sizes")):
+        if all_values[facet]:
+            st.sidebar.multiselect(label, sorted(all_values[facet]), key=key, on_change=reset_catalog_pages,
+                                   format_func=lambda value, facet=facet: f"{value} ({facet_counts[facet].get(value, 0)})")
+
+    # Get only the visible page of products from the database
+    page_size = st.sidebar.selectbox("Products per page", PAGE_SIZE_OPTIONS,
+                                     index=PAGE_SIZE_OPTIONS.index(DEFAULT_PAGE_SIZE),
+                                     key="catalog_page_size", on_change=reset_catalog_pages)
+    sync_catalog_pages((search_text, sort, filters_key(filters), page_size))
+    if search_text:
+        search_page = st.session_state.catalog_cursors[-1] or 0
+        products, has_more = get_search_page(conn, search_text, search_page, page_size, filters, sort)
+        next_cursor = search_page + 1 if has_more else None
+    else:
+        products, next_cursor = get_products_page(conn, st.session_state.catalog_cursors[-1], page_size, filters, sort)
 
-    if not products:
+    if not products and search_text:
+        st.info(f"No products match \"{search_text}\".")
+    elif not products and any(filters.values()):
+        st.info("No products match the selected filters.")
+    elif not products and len(st.session_state.catalog_cursors) == 1:
         st.info("No products available. Add some from the Admin Panel.")
     else:
-        # Display products in a grid (3 columns)
-        col1, col2, col3 = st.columns(3)
-        cols = [col1, col2, col3]
+        # Display products in a grid (3 columns); products still without an image show how their upload is doing
+        image_jobs = latest_job_status(conn, [product[0] for product in products if product[4] is None])
+        with span("app.product_grid", products=len(products)):
+            col1, col2, col3 = st.columns(3)
+            cols = [col1, col2, col3]
         
-        for i, product in enumerate(products):
-            product_id, name, price, available, image_base64, description, color, size = product
-            col = cols[i % 3]
-            
-            with col:
-                with st.container():
-                    st.markdown("<div class='product-card'>", unsafe_allow_html=True)
-                    
-                    # Display the image - using use_container_width instead of deprecated use_column_width
-                    image = base64_to_image(image_base64)
-                    st.image(image, caption="", use_container_width=True, output_format="JPEG")
-                    
-                    # Display product information
-                    st.markdown(f"### {name}")
-                    st.markdown(f"<div class='product-price'>{price:.2f} ₮</div>", unsafe_allow_html=True)
-                    
-                    availability_class = "available" if available else "unavailable"
-                    availability_text = "In Stock" if available else "Out of Stock"
-                    st.markdown(f"<div class='product-availability {availability_class}'>{availability_text}</div>", unsafe_allow_html=True)
-                    
-                    if description:
-                        with st.expander("Details"):
-                            st.write(description)
-                    
-                    if color:
-                        st.markdown(f"**Color:** {color}")
-                    
-                    if size:
-                        st.markdown(f"**Size:** {size}")
-                    
-                    st.markdown("</div>", unsafe_allow_html=True)
-                    st.markdown("<br>", unsafe_allow_html=True)
-                    
-                    if available:
-                        if st.button(f"Add to Cart", key=f"add_to_cart_{product_id}"):
-                            add_to_cart(product_id, name, price, image_base64)
-                            st.success(f"Added {name} to cart!")
+            for i, product in enumerate(products):
+                with cols[i % 3]:
+                    product_card(product, image_jobs.get(product[0]))
+
+    # Page controls
+    page_number = len(st.session_state.catalog_cursors)
+    prev_col, page_col, next_col = st.columns([1, 2, 1])
+    with prev_col:
+        st.button("← Previous", key="catalog_prev", disabled=page_number == 1, on_click=previous_catalog_page)
+    with page_col:
+        st.markdown(f"<div style='text-align: center;'>Page {page_number}</div>", unsafe_allow_html=True)
+    with next_col:
+        st.button("Next →", key="catalog_next", disabled=next_cursor is None,
+                  on_click=next_catalog_page, args=(next_cursor,))
 
     # Check if the user is logged in
     if st.session_state.user_logged_in:
         if st.session_state.is_admin:
+            # pandas is only needed for the admin tables, so shoppers' sessions never pay for importing it
+            import pandas as pd
             st.markdown("<h1 class='main-title'>Admin Panel</h1>", unsafe_allow_html=True)
             
             # Add new product form
@@ -195,37 +351,68 @@ if page == "Main Page":
                 description = st.text_area("Description")
                 color = st.text_input("Color")
                 size = st.text_input("Size")
+                stock = st.number_input("Stock (leave empty to not track inventory)", min_value=0, value=None, step=1)
                 uploaded_file = st.file_uploader("Upload Product Image", type=["jpg", "jpeg", "png"])
                 
                 submitted = st.form_submit_button("Add Product")
                 
                 if submitted:
                     if name and price >= 0 and uploaded_file:
-                        # Process the image
-                        image = Image.open(uploaded_file)
-                        # Resize image to standardize
-                        image = image.resize((600, 600), Image.LANCZOS)
-                        image_base64 = image_to_base64(image)
-                        
-                        # Insert into database
-                        cursor = conn.cursor()
-                        cursor.execute(
-                            "INSERT INTO products (name, price, available, image, description, color, size) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                            (name, price, available, image_base64, description, color, size)
-                        )
-                        conn.commit()
+                        # Insert the product now and queue the upload; the worker resizes and encodes it
+                        with transaction(PRODUCTS_DB) as conn:
+                            cursor = conn.execute(
+                                "INSERT INTO products (name, price, available, description, color, size) VALUES (?, ?, ?, ?, ?, ?)",
+                                (name, price, available, description, color, size)
+                            )
+                            if stock is not None:
+                                set_stock(conn, cursor.lastrowid, stock, available)
+                            job_id = enqueue(conn, PRODUCT_IMAGE, cursor.lastrowid, uploaded_file.getvalue())
+                            bump_catalog_version(conn)
                         
-                        st.success("Product added successfully!")
+                        st.success(f"Product added successfully! Its image is processing in the background (job {job_id}).")
                     else:
                         st.error("Please fill all required fields (Name, Price, Image)")
             
+            # Latest orders placed through checkout
+            st.subheader("Recent Orders")
+            orders = recent_orders(conn)
+            if orders:
+                st.dataframe(pd.DataFrame(
+                    [(order_id, username, total, items, datetime.fromtimestamp(created_at).strftime("%Y-%m-%d %H:%M:%S"))
+                     for order_id, username, total, items, created_at in orders],
+                    columns=["Order", "Customer", "Total", "Items", "Placed"]
+                ), hide_index=True)
+            else:
+                st.info("No orders yet.")
+            
+            # Background image jobs, processed by worker.py
+            st.subheader("Background Jobs")
+            counts = job_counts(conn)
+            job_columns = st.columns(4)
+            for column, status in zip(job_columns, ("queued", "running", "done", "failed")):
+                column.metric(status.capitalize(), counts.get(status, 0))
+            jobs = recent_jobs(conn)
+            if jobs:
+                st.dataframe(pd.DataFrame(
+                    [(job_id, kind, product_id, status, attempts, error,
+                      datetime.fromtimestamp(created_at).strftime("%Y-%m-%d %H:%M:%S"),
+                      datetime.fromtimestamp(finished_at).strftime("%Y-%m-%d %H:%M:%S") if finished_at else None)
+                     for job_id, kind, product_id, status, attempts, error, created_at, finished_at in jobs],
+                    columns=["Job", "Kind", "Product", "Status", "Attempts", "Error", "Queued", "Finished"]
+                ), hide_index=True)
+            if counts.get("queued") and not counts.get("running"):
+                st.caption("Jobs are waiting; make sure the worker process is running (python worker.py).")
+            if st.button("Re-encode All Product Images"):
+                with transaction(PRODUCTS_DB) as conn:
+                    job_id = enqueue(conn, REENCODE_CATALOG)
+                st.success(f"Queued catalog re-encode (job {job_id}).")
+            
             # Manage existing products
             st.subheader("Manage Products")
             
-            # Get products from the database
+            # Get products from the catalog cache
             cursor = conn.cursor()
-            cursor.execute("SELECT id, name, price, available FROM products")
-            products = cursor.fetchall()
+            products = get_product_summaries(conn)
             
             if not products:
                 st.info("No products available.")
@@ -233,6 +420,17 @@ if page == "Main Page":
                 # Convert to DataFrame for easier display
                 df = pd.DataFrame(products, columns=["ID", "Name", "Price", "Available"])
                 st.dataframe(df)
+
+                stats = image_cache.stats()
+                st.caption(
+                    f"Image cache: {stats['entries']} entries, {stats['bytes'] / 1024:.0f} / {stats['max_bytes'] / 1024:.0f} KB, "
+                    f"{stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), {stats['evictions']} evictions"
+                )
+                stats = catalog_cache_stats()
+                st.caption(
+                    f"Catalog cache: version {stats['version']}, {stats['entries']} queries cached, "
+                    f"{stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), {stats['invalidations']} invalidations"
+                )
                 
                 # Delete product
                 product_to_delete = st.selectbox("Select product to delete", 
@@ -260,6 +458,8 @@ if page == "Main Page":
                             description = st.text_area("Description", value=product_data[3] or "")
                             color = st.text_input("Color", value=product_data[4] or "")
                             size = st.text_input("Size", value=product_data[5] or "")
+                            stock = st.number_input("Stock (leave empty to not track inventory)", min_value=0,
+                                                    value=get_stock(conn, product_id), step=1)
                             uploaded_file = st.file_uploader("Upload New Product Image (leave empty to keep current)", 
                                                            type=["jpg", "jpeg", "png"])
                             
@@ -267,25 +467,21 @@ if page == "Main Page":
 
                             if submitted:
                                 if name and price >= 0:
-                                    if uploaded_file:
-                                        # Process the new image
-                                        image = Image.open(uploaded_file)
-                                        image = image.resize((600, 600), Image.LANCZOS)
-                                        image_base64 = image_to_base64(image)
-                                        
-                                        cursor.execute(
-                                            "UPDATE products SET name=?, price=?, available=?, image=?, description=?, color=?, size=? WHERE id=?",
-                                            (name, price, available, image_base64, description, color, size, product_id)
-                                        )
-                                    else:
-                                        # Update without changing the image
-                                        cursor.execute(
+                                    with transaction(PRODUCTS_DB) as conn:
+                                        conn.execute(
                                             "UPDATE products SET name=?, price=?, available=?, description=?, color=?, size=? WHERE id=?",
                                             (name, price, available, description, color, size, product_id)
                                         )
-                                    
-                                    conn.commit()
-                                    st.success("Product updated successfully!")
+                                        set_stock(conn, product_id, stock, available)
+                                        if uploaded_file:
+                                            # The current image stays up until the worker has processed the new one
+                                            job_id = enqueue(conn, PRODUCT_IMAGE, int(product_id), uploaded_file.getvalue())
+                                        bump_catalog_version(conn)
+                                    invalidate_product(product_id)
+                                    if uploaded_file:
+                                        st.success(f"Product updated successfully! The new image is processing in the background (job {job_id}).")
+                                    else:
+                                        st.success("Product updated successfully!")
                                 else:
                                     st.error("Please fill all required fields (Name, Price)")
 
@@ -296,13 +492,40 @@ elif page == "Sign Up":
 
 elif page == "Shopping Cart":
     st.markdown("<h3 class='main-title' style='text-align: left;'>Shopping Cart</h3>", unsafe_allow_html=True)
+    if "placed_order" in st.session_state:
+        st.success(f"Order #{st.session_state.pop('placed_order')} placed. Thank you for your purchase!")
     display_cart()
     if st.button("Proceed to Checkout"):
         if not st.session_state.user_logged_in:
             st.warning("Please log in to proceed to checkout.")
         else:
-            st.success("Proceeding to checkout...")
+            order_id, problems = checkout(st.session_state.cart, st.session_state.username)
+            if order_id:
+                # Rerun so the emptied cart is drawn
+                clear_cart()
+                st.session_state.placed_order = order_id
+                st.rerun()
+            for problem in problems:
+                st.error(problem)
+
+elif page == "Performance" and st.session_state.is_admin:
+    import pandas as pd
+    st.markdown("<h3 class='main-title' style='text-align: left;'>Performance</h3>", unsafe_allow_html=True)
+    st.caption("Latencies of the instrumented spans in this server process, slowest total first. "
+               f"Percentiles cover the latest {perf.SAMPLES_PER_SPAN} samples of each span. "
+               f"Set {perf.LOG_PATH_ENV} to also log every sample as JSON lines.")
+    rows = perf.summary()
+    if rows:
+        st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+    else:
+        st.info("No samples recorded yet.")
+    st.subheader("Caches and write buffers")
+    st.json({"images": image_cache.stats(), "catalog": catalog_cache_stats(), "carts": cart_store.stats()})
+    if st.button("Reset timings"):
+        perf.reset()
+        st.rerun()
 
 # Footer
 st.markdown("---")
-st.markdown("© 2025 Product Showcase. All rights reserved.")
\ No newline at end of file
+st.markdown("© 2025 Product Showcase. All rights reserved.")
+perf.record("app.rerun", (time.perf_counter() - rerun_started) * 1000, page=page)
\ No newline at end of file
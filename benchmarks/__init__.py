@@ -0,0 +1,7 @@
+# Benchmarks for the storefront's hot paths against synthetic catalogs.
+#
+#   python -m benchmarks.synthetic --products 10000 --out /tmp/catalog
+#   python -m benchmarks.run --sizes 1000 10000 --output results.json
+#
+# Each benchmark runs inside a scratch directory holding its own products.db,
+# so the app's relative database paths never touch the repository's databases.
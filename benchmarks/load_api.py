@@ -0,0 +1,158 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from benchmarks.synthetic import REPO_ROOT, prepare_workdir
+from db_init import close_all
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# Start api.py in its own process, as it runs in production, and wait until it accepts connections
+def start_server(workdir, port):
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    server = subprocess.Popen([sys.executable, os.path.join(REPO_ROOT, "api.py"), "--port", str(port)],
+                              cwd=workdir, env=env, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server
+        except OSError:
+            if server.poll() is not None:
+                raise RuntimeError("api.py exited during startup")
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("api.py did not start listening")
+
+
+def get(conn, path, headers=None):
+    conn.request("GET", path, headers=headers or {})
+    response = conn.getresponse()
+    return response.status, response.getheader("ETag"), response.read()
+
+
+# Each scenario makes one request per call on a client's keep-alive connection; state is per client
+def first_page(conn, state):
+    return get(conn, "/api/products")[0]
+
+
+def revalidate_first_page(conn, state):
+    if "etag" not in state:
+        state["etag"] = get(conn, "/api/products")[1]
+    return get(conn, "/api/products", {"If-None-Match": state["etag"]})[0]
+
+
+# Page through the whole catalog by following the next links, starting over at the end
+def walk_catalog(conn, state):
+    status, _, body = get(conn, state.get("next") or "/api/products?sort=price_asc&in_stock=1")
+    state["next"] = json.loads(body)["next"]
+    return status
+
+
+def search(conn, state):
+    return get(conn, f"/api/products?q={state['rng'].choice(['hoodie', 'red', 'slim', 'summer+jack'])}")[0]
+
+
+def card_image(conn, state):
+    path = f"{state['rng'].choice(state['images'])}?width=400"
+    return get(conn, path, {"Accept": "image/avif,image/webp,image/*,*/*;q=0.8"})[0]
+
+
+SCENARIOS = {
+    "first_page": first_page,
+    "first_page_304": revalidate_first_page,
+    "walk_catalog": walk_catalog,
+    "search": search,
+    "card_image_webp": card_image,
+}
+
+
+# Run clients concurrent keep-alive clients for duration seconds; returns throughput and latencies
+def run_scenario(port, scenario, clients, duration, images):
+    latencies, statuses, lock = [], {}, threading.Lock()
+    start = threading.Barrier(clients + 1)
+    stop_at = []
+
+    def client(seed):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        state = {"rng": random.Random(seed), "images": images}
+        samples, counts = [], {}
+        start.wait()
+        while time.perf_counter() < stop_at[0]:
+            began = time.perf_counter()
+            status = scenario(conn, state)
+            samples.append((time.perf_counter() - began) * 1000)
+            counts[status] = counts.get(status, 0) + 1
+        conn.close()
+        with lock:
+            latencies.extend(samples)
+            for status, count in counts.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    began = time.perf_counter()
+    stop_at.append(began + duration)
+    start.wait()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - began
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "requests_per_s": round(len(latencies) / elapsed, 1),
+        "latency_p50_ms": round(statistics.median(latencies), 3),
+        "latency_p95_ms": round(latencies[int(len(latencies) * 0.95)], 3),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the catalog JSON API and report requests/sec.")
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--clients", type=int, default=16, help="concurrent keep-alive connections")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per scenario")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS),
+                        help="scenario to run, repeatable (default: all)")
+    args = parser.parse_args(argv)
+
+    cwd = os.getcwd()
+    report = {"products": args.products, "clients": args.clients, "duration_s": args.duration}
+    with tempfile.TemporaryDirectory(prefix="ehome-api-") as scratch:
+        workdir = os.path.join(scratch, "catalog")
+        try:
+            prepare_workdir(workdir, args.products, distinct_images=50)
+            close_all()
+        finally:
+            os.chdir(cwd)
+        port = free_port()
+        server = start_server(workdir, port)
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port)
+            products = json.loads(get(conn, "/api/products?limit=100")[2])["products"]
+            conn.close()
+            images = sorted({product["image"] for product in products if product["image"]})
+            for name in args.scenario or SCENARIOS:
+                report[name] = run_scenario(port, SCENARIOS[name], args.clients, args.duration, images)
+        finally:
+            server.terminate()
+            server.wait()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
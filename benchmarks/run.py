@@ -0,0 +1,245 @@
+import argparse
+import base64
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from PIL import Image
+from benchmarks.synthetic import REPO_ROOT, prepare_workdir, synthetic_photo
+from db_init import get_connection, close_all, PRODUCTS_DB
+from image_store import build_variants, load_image, FORMATS, WIDTHS, FULL_SIZE
+from image_cache import get_product_image, image_cache
+from product_management import (
+    fetch_products_page, get_products_page, get_product_summaries, reset_catalog_cache, DEFAULT_PAGE_SIZE
+)
+from cart_management import get_cart_lines
+import perf
+
+CART_ITEMS = 20
+# Rendition widths the app requests for product cards and cart thumbnails
+CARD_WIDTH = 400
+THUMB_WIDTH = 100
+
+
+# Time fn over several runs after warming up; returns summary statistics in milliseconds
+def measure(fn, repeat=20, warmup=2):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "runs": len(samples),
+        "min_ms": round(samples[0], 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "max_ms": round(samples[-1], 3),
+    }
+
+
+def bench_main_page_query(conn):
+    last_id = conn.execute("SELECT MAX(id) FROM products").fetchone()[0]
+    deep_cursor = max(0, last_id - DEFAULT_PAGE_SIZE * 2)
+    results = {
+        "first_page": measure(lambda: fetch_products_page(conn, None, DEFAULT_PAGE_SIZE)),
+        "deep_page": measure(lambda: fetch_products_page(conn, deep_cursor, DEFAULT_PAGE_SIZE)),
+        "price_sorted_in_stock": measure(lambda: fetch_products_page(
+            conn, None, DEFAULT_PAGE_SIZE, {"in_stock": True}, "price_asc")),
+        "cached_first_page": measure(lambda: get_products_page(conn, None, DEFAULT_PAGE_SIZE)),
+        # What every rerun cost before pagination: the whole table
+        "full_table_scan": measure(lambda: conn.execute(
+            "SELECT id, name, price, available, image_key, description, color, size FROM products").fetchall(),
+            repeat=5, warmup=1),
+    }
+    return results
+
+
+def bench_image_decode(conn):
+    rows, _ = fetch_products_page(conn, None, DEFAULT_PAGE_SIZE)
+
+    def page_from_store():
+        for row in rows:
+            load_image(conn, row[4], CARD_WIDTH)
+
+    def page_through_cache():
+        for row in rows:
+            get_product_image(conn, row[0], row[4], CARD_WIDTH)
+
+    full = load_image(conn, rows[0][4], FULL_SIZE[0])
+    legacy = base64.b64encode(full).decode()
+
+    # The pre-image-store path: base64 text decoded and opened with PIL for every card
+    def legacy_base64_to_image():
+        Image.open(io.BytesIO(base64.b64decode(legacy))).load()
+
+    image_cache.clear()
+    return {
+        "page_from_store": measure(page_from_store),
+        "page_through_cache": measure(page_through_cache),
+        "legacy_base64_to_image": measure(legacy_base64_to_image),
+        "card_bytes": len(load_image(conn, rows[0][4], CARD_WIDTH)),
+        "legacy_base64_bytes": len(legacy),
+    }
+
+
+# Image bytes a shopper downloads for one page of cards and for a cart, per format, against the single
+# 600px image every render site used to get
+def bench_image_bytes(conn):
+    rows, _ = fetch_products_page(conn, None, DEFAULT_PAGE_SIZE)
+    keys = [row[4] for row in rows]
+
+    def total(width, fmt):
+        return sum(len(load_image(conn, key, width, fmt) or b"") for key in keys)
+
+    result = {"page_full_jpeg": total(FULL_SIZE[0], "jpeg")}
+    for fmt in FORMATS:
+        result[f"page_cards_{fmt}"] = total(CARD_WIDTH, fmt)
+        result[f"page_thumbs_{fmt}"] = total(THUMB_WIDTH, fmt)
+    result["renditions"] = {f"{fmt}-{width}": len(load_image(conn, keys[0], width, fmt) or b"")
+                            for fmt in FORMATS for width in WIDTHS}
+    return result
+
+
+def bench_admin_listing(conn):
+    import pandas as pd
+
+    def listing():
+        reset_catalog_cache()
+        pd.DataFrame(get_product_summaries(conn), columns=["ID", "Name", "Price", "Available"])
+
+    return {"dataframe": measure(listing, repeat=5, warmup=1)}
+
+
+def bench_image_encode():
+    upload = synthetic_photo(random.Random(7))
+    return {"build_variants_1200px_upload": measure(lambda: build_variants(upload), repeat=5, warmup=1)}
+
+
+def bench_cart(conn):
+    ids = [row[0] for row in conn.execute("SELECT id FROM products ORDER BY RANDOM() LIMIT ?", (CART_ITEMS,))]
+    cart = {product_id: 1 + i % 3 for i, product_id in enumerate(ids)}
+
+    def render():
+        lines, _ = get_cart_lines(conn, cart)
+        for product_id, _, _, _, image_key, _ in lines:
+            get_product_image(conn, product_id, image_key, THUMB_WIDTH)
+
+    def render_cold():
+        reset_catalog_cache()
+        image_cache.clear()
+        render()
+
+    return {"cold": measure(render_cold), "warm": measure(render), "items": len(cart)}
+
+
+# Full script runs of app.py as a shopper sees them; skipped if streamlit is not installed
+def bench_apptest(runs):
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        return {"skipped": "streamlit is not installed"}
+    reset_catalog_cache()
+    image_cache.clear()
+    at = AppTest.from_file(os.path.join(REPO_ROOT, "app.py"), default_timeout=120)
+    started = time.perf_counter()
+    at.run()
+    first = (time.perf_counter() - started) * 1000
+    if at.exception:
+        return {"error": at.exception[0].value}
+    result = {"first_run_ms": round(first, 3), "rerun": measure(at.run, repeat=runs, warmup=1)}
+
+    # Per-click cost of "Add to Cart". "rerun" above is what every click cost when it reran the whole
+    # script; a click now reruns just the clicked card and the cart panel, which AppTest replays too
+    # on Streamlit with keyed fragments (and the whole script on older versions)
+    buttons = [b for b in at.button if b.key and b.key.startswith("add_to_cart_")]
+    if buttons:
+        perf.reset()
+        key = buttons[0].key
+        result["add_to_cart_click"] = measure(lambda: at.button(key=key).click().run(), repeat=runs, warmup=1)
+        spans = {row["span"]: row for row in perf.summary()}
+        for name in ("app.product_card", "app.cart"):
+            if name in spans:
+                result[f"{name.split('.')[1]}_fragment_p50_ms"] = spans[name]["p50_ms"]
+    return result
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "-C", REPO_ROOT, "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_size(n_products, workdir, apptest_runs, distinct_images):
+    generate_seconds = prepare_workdir(workdir, n_products, distinct_images)
+    conn = get_connection(PRODUCTS_DB)
+    result = {
+        "products": n_products,
+        "generate_s": round(generate_seconds, 2),
+        "db_bytes": os.path.getsize(PRODUCTS_DB),
+        "main_page_query": bench_main_page_query(conn),
+        "image_decode": bench_image_decode(conn),
+        "image_bytes": bench_image_bytes(conn),
+        "admin_listing": bench_admin_listing(conn),
+        "image_encode": bench_image_encode(),
+        "cart_render": bench_cart(conn),
+    }
+    if apptest_runs:
+        result["apptest"] = bench_apptest(apptest_runs)
+    close_all()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the storefront against synthetic catalogs.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000],
+                        help="catalog sizes to generate (e.g. 1000 10000 100000)")
+    parser.add_argument("--distinct-images", type=int, default=200)
+    parser.add_argument("--apptest-runs", type=int, default=5, help="full-script reruns per size, 0 to skip")
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    cwd = os.getcwd()
+    results = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "sizes": [],
+    }
+    # The app prints status lines; keep stdout for the JSON results
+    with tempfile.TemporaryDirectory(prefix="ehome-bench-") as scratch, contextlib.redirect_stdout(sys.stderr):
+        try:
+            for n in args.sizes:
+                print(f"Benchmarking {n} products...", file=sys.stderr)
+                results["sizes"].append(run_size(n, os.path.join(scratch, str(n)), args.apptest_runs,
+                                                 args.distinct_images))
+        finally:
+            os.chdir(cwd)
+            close_all()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
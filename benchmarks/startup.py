@@ -0,0 +1,94 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from benchmarks.synthetic import REPO_ROOT, prepare_workdir
+from db_init import close_all
+
+# Runs in a fresh interpreter, as a newly started server process would: times importing streamlit,
+# the first render of app.py for a shopper and a rerun, and notes which heavy modules got imported
+CHILD = r'''
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+at.run()
+first = time.perf_counter()
+import perf
+first_spans = {row["span"]: row["max_ms"] for row in perf.summary()}
+perf.reset()
+at.run()
+rerun = time.perf_counter()
+rerun_spans = {row["span"]: row["max_ms"] for row in perf.summary()}
+print(json.dumps({
+    "error": at.exception[0].value if at.exception else None,
+    "streamlit_import_ms": (imported - started) * 1000,
+    "first_render_ms": (first - imported) * 1000,
+    "rerun_ms": (rerun - first) * 1000,
+    "first_spans": first_spans,
+    "rerun_spans": rerun_spans,
+    "pandas_imported": "pandas" in sys.modules,
+}))
+'''
+
+# Spans of the per-run setup work in app.py
+SETUP_SPANS = ("app.initialize_db", "app.load_css", "app.logo")
+
+
+def run_child(repo, workdir):
+    env = dict(os.environ, PYTHONPATH=repo)
+    output = subprocess.run([sys.executable, "-c", CHILD, os.path.join(repo, "app.py")], cwd=workdir, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def median(samples):
+    return round(statistics.median(samples), 3)
+
+
+# Median startup timings over several fresh processes
+def bench_startup(repo, workdir, runs):
+    results = [run_child(repo, workdir) for _ in range(runs)]
+    errors = [r["error"] for r in results if r["error"]]
+    if errors:
+        return {"error": errors[0]}
+    report = {
+        "runs": runs,
+        "streamlit_import_ms": median([r["streamlit_import_ms"] for r in results]),
+        "first_render_ms": median([r["first_render_ms"] for r in results]),
+        "rerun_ms": median([r["rerun_ms"] for r in results]),
+        "pandas_imported_for_shopper": any(r["pandas_imported"] for r in results),
+    }
+    for name in SETUP_SPANS:
+        report[f"{name}_first_ms"] = median([r["first_spans"].get(name, 0.0) for r in results])
+        report[f"{name}_rerun_ms"] = median([r["rerun_spans"].get(name, 0.0) for r in results])
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time a fresh process's first render of app.py and a rerun.")
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes to take the median over")
+    parser.add_argument("--repo", default=REPO_ROOT,
+                        help="checkout whose app.py is timed, e.g. an older revision to compare against")
+    args = parser.parse_args(argv)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="ehome-startup-") as scratch:
+        try:
+            prepare_workdir(os.path.join(scratch, "catalog"), args.products, distinct_images=20)
+            close_all()
+            report = bench_startup(os.path.abspath(args.repo), os.getcwd(), args.runs)
+        finally:
+            os.chdir(cwd)
+            close_all()
+    report["products"] = args.products
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.synthetic import prepare_workdir
+from db_init import get_connection, transaction, close_all, PRODUCTS_DB
+from order_management import checkout, set_stock
+
+
+# Every this many carts also hold a product deleted after it was added, which checkout must leave out
+DELETED_LINE_EVERY = 5
+
+
+# Run many checkouts at once against one scarce SKU (plus a plentiful second line in every cart)
+# and check that stock, orders and order items still add up; returns the report
+def stress(checkouts, threads, stock, max_quantity):
+    with transaction(PRODUCTS_DB) as conn:
+        scarce, plentiful, deleted = [row[0] for row in conn.execute("SELECT id FROM products ORDER BY id LIMIT 3")]
+        scarce_name = conn.execute("SELECT name FROM products WHERE id = ?", (scarce,)).fetchone()[0]
+        conn.execute("UPDATE products SET available = 1 WHERE id IN (?, ?)", (scarce, plentiful))
+        set_stock(conn, scarce, stock)
+        set_stock(conn, plentiful, checkouts)
+        conn.execute("DELETE FROM products WHERE id = ?", (deleted,))
+
+    start = threading.Barrier(threads)
+    started_threads = set()
+
+    def buy(i):
+        # Hold every worker thread until all of them are ready, so the checkouts really overlap
+        if threading.get_ident() not in started_threads:
+            started_threads.add(threading.get_ident())
+            start.wait()
+        quantity = 1 + i % max_quantity
+        cart = {scarce: quantity, plentiful: 1}
+        if i % DELETED_LINE_EVERY == 0:
+            cart[deleted] = 1
+        began = time.perf_counter()
+        try:
+            order_id, problems = checkout(cart, f"stress-{i}")
+            error = None
+        except sqlite3.Error as e:
+            order_id, problems, error = None, [], str(e)
+        return order_id, quantity, (time.perf_counter() - began) * 1000, error, problems, deleted in cart
+
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(buy, range(checkouts)))
+    elapsed = time.perf_counter() - began
+
+    conn = get_connection(PRODUCTS_DB)
+    remaining = conn.execute("SELECT quantity FROM stock WHERE product_id = ?", (scarce,)).fetchone()[0]
+    plentiful_left = conn.execute("SELECT quantity FROM stock WHERE product_id = ?", (plentiful,)).fetchone()[0]
+    sold = conn.execute("SELECT COALESCE(SUM(quantity), 0) FROM order_items WHERE product_id = ?",
+                        (scarce,)).fetchone()[0]
+    orders = conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+    deleted_items = conn.execute("SELECT COUNT(*) FROM order_items WHERE product_id = ?", (deleted,)).fetchone()[0]
+    placed = [r for r in results if r[0]]
+    latencies = sorted(r[2] for r in results)
+    errors = [r[3] for r in results if r[3]]
+    # Carts may only be turned away because the scarce SKU ran out, not for their deleted line
+    wrongly_rejected = [r[4] for r in results if not r[0] and not r[3]
+                        and not all(scarce_name in problem for problem in r[4])]
+    report = {
+        "checkouts": checkouts,
+        "threads": threads,
+        "initial_stock": stock,
+        "orders_placed": len(placed),
+        "rejected": checkouts - len(placed) - len(errors),
+        "errors": len(errors),
+        "units_sold": sold,
+        "units_remaining": remaining,
+        "orders_with_deleted_line": sum(1 for r in placed if r[5]),
+        "wrongly_rejected": len(wrongly_rejected),
+        "elapsed_s": round(elapsed, 3),
+        "checkouts_per_s": round(checkouts / elapsed, 1),
+        "orders_per_s": round(len(placed) / elapsed, 1),
+        "latency_p50_ms": round(latencies[len(latencies) // 2], 3),
+        "latency_p95_ms": round(latencies[int(len(latencies) * 0.95)], 3),
+        "latency_max_ms": round(latencies[-1], 3),
+    }
+    # Every unit is either sold exactly once or still in stock, and whole carts went through together
+    report["consistent"] = (
+        remaining >= 0
+        and sold + remaining == stock
+        and sold == sum(r[1] for r in placed)
+        and orders == len(placed)
+        and plentiful_left == checkouts - len(placed)
+        and deleted_items == 0
+        and not wrongly_rejected
+    )
+    if errors:
+        report["first_error"] = errors[0]
+    if wrongly_rejected:
+        report["first_wrong_rejection"] = wrongly_rejected[0]
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stress concurrent checkouts against one SKU and check for overselling.")
+    parser.add_argument("--checkouts", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=200, help="checkouts in flight at once")
+    parser.add_argument("--stock", type=int, default=300, help="units of the contended SKU")
+    parser.add_argument("--max-quantity", type=int, default=3, help="units per cart cycle through 1..N")
+    args = parser.parse_args(argv)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="ehome-stress-") as scratch:
+        try:
+            prepare_workdir(os.path.join(scratch, "catalog"), 100, distinct_images=5)
+            report = stress(args.checkouts, min(args.threads, args.checkouts), args.stock, args.max_quantity)
+        finally:
+            os.chdir(cwd)
+            close_all()
+    print(json.dumps(report, indent=2))
+    if not report["consistent"]:
+        print("Stock and orders do not add up, or carts were turned away for a deleted product", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import argparse
+import os
+import random
+import shutil
+import time
+from PIL import Image, ImageDraw, ImageFilter
+from db_init import get_connection, transaction, close_all, PRODUCTS_DB
+from image_store import build_variants, store_variants
+from init_db import initialize_db
+from product_management import bump_catalog_version, reset_catalog_cache
+from image_cache import image_cache
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COLORS = ["Black", "White", "Red", "Blue", "Green", "Grey", "Navy", "Beige", "Pink", "Brown"]
+SIZES = ["XS", "S", "M", "L", "XL", "XXL"]
+NOUNS = ["T-Shirt", "Hoodie", "Jacket", "Dress", "Jeans", "Sneakers", "Scarf", "Cap", "Sweater", "Skirt"]
+ADJECTIVES = ["Classic", "Slim", "Organic", "Vintage", "Summer", "Winter", "Sport", "Casual", "Premium", "Relaxed"]
+# Pool photos are generated near the stored size to keep catalog generation quick
+CATALOG_PHOTO_SIZE = (800, 800)
+WORDS = ("soft cotton blend with a relaxed fit made from recycled fibres machine washable "
+         "breathable fabric everyday wear limited edition hand finished seams").split()
+
+
+# A photo-like upload: shapes and gradients with sensor-style noise, so JPEG sizes
+# land near those of real product shots instead of flat colors
+def synthetic_photo(rng, size=(1200, 1200)):
+    img = Image.new("RGB", size, tuple(rng.randint(120, 255) for _ in range(3)))
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x0, y0 = rng.randint(0, size[0]), rng.randint(0, size[1])
+        x1, y1 = x0 + rng.randint(80, 600), y0 + rng.randint(80, 600)
+        draw.ellipse([x0, y0, x1, y1], fill=tuple(rng.randint(0, 255) for _ in range(3)))
+    img = img.filter(ImageFilter.GaussianBlur(6))
+    noise = Image.effect_noise(size, 24).convert("RGB")
+    return Image.blend(img, noise, 0.12)
+
+
+def synthetic_product(rng, index, image_key):
+    return (
+        f"SYN-{index:07d}",
+        f"{rng.choice(ADJECTIVES)} {rng.choice(COLORS)} {rng.choice(NOUNS)} {index}",
+        float(rng.randrange(5, 500) * 1000),
+        rng.random() > 0.1,
+        image_key,
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 30))),
+        rng.choice(COLORS),
+        rng.choice(SIZES),
+    )
+
+
+# Build products.db in the current directory holding n synthetic products.
+# Products share a pool of distinct images, as a real catalog shares photos across variants.
+def generate_catalog(n_products, distinct_images=200, seed=1234):
+    rng = random.Random(seed)
+    initialize_db()
+    keys = []
+    with transaction(PRODUCTS_DB) as conn:
+        for _ in range(min(distinct_images, n_products)):
+            key, variants = build_variants(synthetic_photo(rng, CATALOG_PHOTO_SIZE))
+            store_variants(conn, key, variants)
+            keys.append(key)
+    with transaction(PRODUCTS_DB) as conn:
+        for start in range(0, n_products, 5000):
+            conn.executemany('''
+                INSERT INTO products (sku, name, price, available, image_key, description, color, size)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [synthetic_product(rng, i, keys[i % len(keys)])
+                  for i in range(start, min(start + 5000, n_products))])
+        bump_catalog_version(conn)
+    # Move the WAL into products.db, so its file size is the size of the whole catalog
+    get_connection(PRODUCTS_DB).execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+# Create a scratch directory with a fresh catalog and the files app.py reads relative to the cwd,
+# then switch into it; the process-wide pools and caches are reset so nothing leaks between catalogs
+def prepare_workdir(path, n_products, distinct_images=200, seed=1234):
+    close_all()
+    reset_catalog_cache()
+    image_cache.clear()
+    if os.path.exists(path) and os.listdir(path):
+        raise SystemExit(f"{path} is not empty")
+    os.makedirs(path, exist_ok=True)
+    shutil.copy(os.path.join(REPO_ROOT, "styles.css"), path)
+    shutil.copy(os.path.join(REPO_ROOT, "users.db"), path)
+    os.chdir(path)
+    started = time.perf_counter()
+    generate_catalog(n_products, distinct_images, seed)
+    return time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic products.db for benchmarking.")
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--distinct-images", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--out", required=True, help="new or empty directory to build the catalog in")
+    args = parser.parse_args(argv)
+    elapsed = prepare_workdir(os.path.abspath(args.out), args.products, args.distinct_images, args.seed)
+    size = os.path.getsize(PRODUCTS_DB)
+    print(f"Generated {args.products} products in {elapsed:.1f}s ({size / 1024 / 1024:.1f} MB) at {os.getcwd()}")
+    close_all()
+
+
+if __name__ == "__main__":
+    main()
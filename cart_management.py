@@ -0,0 +1,120 @@
+import streamlit as st
+from product_management import cached_query
+from cart_store import cart_store
+from perf import timed
+
+# Largest quantity of one product a cart line accepts
+MAX_QUANTITY = 99
+
+
+# The cart is a compact {product_id: quantity} dict; names, prices and images are looked up when shown
+def init_cart():
+    if 'cart' not in st.session_state:
+        st.session_state.cart = {}
+
+
+# Queue the cart for saving when a user is logged in; the write happens on the store's next flush
+def persist_cart():
+    if st.session_state.get("user_logged_in"):
+        cart_store.save(st.session_state.username, st.session_state.cart)
+
+
+# Session state key of a cart line's quantity widget
+def quantity_key(product_id):
+    return f"cart_qty_{product_id}"
+
+
+# Set a line's quantity (0 removes it); meant to run from widget callbacks, before the cart is drawn.
+# The line's quantity widget state is dropped so it is redrawn from the cart
+def set_quantity(product_id, quantity):
+    init_cart()
+    quantity = max(0, min(int(quantity), MAX_QUANTITY))
+    if quantity:
+        st.session_state.cart[product_id] = quantity
+    else:
+        st.session_state.cart.pop(product_id, None)
+    st.session_state.pop(quantity_key(product_id), None)
+    persist_cart()
+
+
+def add_to_cart(product_id, quantity=1):
+    init_cart()
+    set_quantity(product_id, st.session_state.cart.get(product_id, 0) + quantity)
+
+
+def remove_from_cart(product_id):
+    set_quantity(product_id, 0)
+
+
+# Empty the cart, e.g. after checkout
+def clear_cart():
+    for product_id in st.session_state.get("cart", {}):
+        st.session_state.pop(quantity_key(product_id), None)
+    st.session_state.cart = {}
+    persist_cart()
+
+
+# On login, bring back the user's saved cart merged with lines added before logging in
+def restore_cart(username):
+    init_cart()
+    added = st.session_state.cart
+    cart = cart_store.load(username)
+    for product_id, quantity in added.items():
+        cart[product_id] = max(cart.get(product_id, 0), quantity)
+    for product_id in cart:
+        st.session_state.pop(quantity_key(product_id), None)
+    st.session_state.cart = cart
+    if added:
+        cart_store.save(username, cart)
+
+
+# Callback for a line's quantity widget
+def update_quantity_from_widget(product_id):
+    set_quantity(product_id, st.session_state.get(quantity_key(product_id)) or 0)
+
+
+# Name, current price, availability and image key of the given products in one batched query
+@timed("db.fetch_cart_products")
+def fetch_cart_products(conn, product_ids):
+    if not product_ids:
+        return {}
+    rows = conn.execute(
+        f"SELECT id, name, price, available, image_key FROM products WHERE id IN ({', '.join('?' for _ in product_ids)})",
+        list(product_ids)
+    ).fetchall()
+    return {row[0]: row[1:] for row in rows}
+
+
+def get_cart_products(conn, product_ids):
+    ids = tuple(sorted(product_ids))
+    return cached_query(conn, ("cart", ids), lambda: fetch_cart_products(conn, ids))
+
+
+# Drop lines of the session cart whose product was deleted since it was added, so they don't linger
+# unseen in the cart and its saved copy; returns the ids dropped
+def prune_cart(conn):
+    cart = st.session_state.get("cart", {})
+    products = get_cart_products(conn, cart.keys())
+    missing = [product_id for product_id in cart if product_id not in products]
+    for product_id in missing:
+        del cart[product_id]
+        st.session_state.pop(quantity_key(product_id), None)
+    if missing:
+        persist_cart()
+    return missing
+
+
+# Resolve a cart into display lines and a total at current prices
+# Lines are (product_id, name, price, quantity, image_key, available); products deleted since are dropped
+def get_cart_lines(conn, cart):
+    products = get_cart_products(conn, cart.keys())
+    lines = []
+    total = 0.0
+    for product_id, quantity in cart.items():
+        product = products.get(product_id)
+        if product is None:
+            continue
+        name, price, available, image_key = product
+        lines.append((product_id, name, price, quantity, image_key, available))
+        total += price * quantity
+    return lines, total
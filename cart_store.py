@@ -0,0 +1,108 @@
+import atexit
+import sqlite3
+import threading
+import time
+from db_init import get_connection, transaction, PRODUCTS_DB
+from perf import span
+
+# How often buffered cart changes are written; a crash loses at most this much cart editing
+FLUSH_INTERVAL_SECONDS = 2.0
+
+
+# Create the table holding each logged-in user's saved cart
+def init_cart_store(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS carts (
+            username TEXT NOT NULL,
+            product_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            PRIMARY KEY (username, product_id)
+        ) WITHOUT ROWID
+    ''')
+
+
+# Write-behind store of per-user carts. Saves only replace the user's latest snapshot in memory, so
+# any number of clicks between flushes costs one write; a background thread writes every changed
+# cart in one transaction per interval
+class CartStore:
+    def __init__(self, path=PRODUCTS_DB, interval=FLUSH_INTERVAL_SECONDS):
+        self.path = path
+        self.interval = interval
+        self._pending = {}
+        self._flushing = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self.saves = 0
+        self.flushes = 0
+        self.carts_written = 0
+
+    # Record a user's whole cart as {product_id: quantity}; written on the next flush
+    def save(self, username, cart):
+        with self._lock:
+            self._pending[username] = dict(cart)
+            self.saves += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="cart-flush", daemon=True)
+                self._thread.start()
+
+    # A user's saved cart, including changes not yet written
+    def load(self, username):
+        with self._lock:
+            for buffered in (self._pending, self._flushing):
+                if username in buffered:
+                    return dict(buffered[username])
+        rows = get_connection(self.path).execute(
+            "SELECT product_id, quantity FROM carts WHERE username = ?", (username,)).fetchall()
+        return dict(rows)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"Cart flush failed, retrying: {e}")
+
+    # Write every changed cart in one transaction; returns the number of carts written
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                self._flushing, self._pending = self._pending, {}
+                flushing = self._flushing
+            if not flushing:
+                return 0
+            try:
+                with span("db.flush_carts", carts=len(flushing)), transaction(self.path) as conn:
+                    conn.executemany("DELETE FROM carts WHERE username = ?", [(username,) for username in flushing])
+                    conn.executemany(
+                        "INSERT INTO carts (username, product_id, quantity) VALUES (?, ?, ?)",
+                        [(username, int(product_id), quantity)
+                         for username, cart in flushing.items() for product_id, quantity in cart.items()]
+                    )
+            except Exception:
+                # Keep the snapshots for the next flush unless newer ones arrived meanwhile
+                with self._lock:
+                    for username, cart in flushing.items():
+                        self._pending.setdefault(username, cart)
+                    self._flushing = {}
+                raise
+            with self._lock:
+                self._flushing = {}
+                self.flushes += 1
+                self.carts_written += len(flushing)
+            return len(flushing)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "saves": self.saves,
+                "flushes": self.flushes,
+                "carts_written": self.carts_written,
+            }
+
+
+cart_store = CartStore()
+# Write what is still buffered when the server shuts down
+atexit.register(cart_store.flush)
@@ -1,28 +1,305 @@
+import argparse
+import hashlib
+import os
 import sqlite3
+from db_init import get_connection, transaction, close_all, PRODUCTS_DB, USERS_DB
+from migrations import migrate_all
 
-def check_users_db():
-    conn = sqlite3.connect('users.db')
-    cursor = conn.cursor()
-    
-    # Check the structure of the users table
-    cursor.execute("PRAGMA table_info(users)")
-    columns = cursor.fetchall()
-    print("Users table structure:")
-    for column in columns:
-        print(column)
-    
-    # Print the contents of the users table
-    cursor.execute("SELECT * FROM users")
-    users = cursor.fetchall()
-    print("\nUsers table contents:")
-    for user in users:
-        print(user)
-    
-    conn.close()
+# Columns holding large values; their bytes are summed in the report
+BLOB_COLUMNS = {
+    "products": ["image"],
+    "product_images": ["data"],
+    "jobs": ["payload"],
+}
 
-if __name__ == "__main__":
-    check_users_db()
-```
-### Step 5: Verify the Changes
 
-Run the `check_users_db.py` script to verify that the `is_admin` column has been added and that the table contains the correct data.
+def format_bytes(n):
+    sign, n = ("-" if n < 0 else ""), abs(n)
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{sign}{n:.0f} {unit}" if unit == "B" else f"{sign}{n:.1f} {unit}"
+        n /= 1024
+
+
+# Size of the database file and its write-ahead log
+def file_sizes(path):
+    return {name: os.path.getsize(f) if os.path.exists(f) else 0
+            for name, f in (("db", path), ("wal", path + "-wal"))}
+
+
+def print_sizes(path, before, after):
+    change = after["db"] + after["wal"] - before["db"] - before["wal"]
+    print(f"{path}: {format_bytes(before['db'])} + {format_bytes(before['wal'])} WAL -> "
+          f"{format_bytes(after['db'])} + {format_bytes(after['wal'])} WAL "
+          f"({format_bytes(-change) + ' reclaimed' if change <= 0 else '+' + format_bytes(change)})")
+
+
+def pragma(conn, name):
+    return conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+
+# Ordinary tables, including the FTS index's shadow tables
+def table_names(conn):
+    return [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' "
+        "AND sql NOT LIKE 'CREATE VIRTUAL TABLE%' ORDER BY name")]
+
+
+# {table or index: (pages, bytes, unused bytes)}; empty when SQLite was built without dbstat
+def page_usage(conn):
+    try:
+        rows = conn.execute(
+            "SELECT name, COUNT(*), SUM(pgsize), SUM(unused) FROM dbstat GROUP BY name").fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    return {name: (pages, size, unused) for name, pages, size, unused in rows}
+
+
+# Image keys whose largest JPEG rendition has the same bytes, as {digest: [keys]} with more than one key.
+# Keys are content hashes, so these only appear when images were stored by other means
+def duplicate_images(conn):
+    groups = {}
+    for key, data in conn.execute('''
+        SELECT key, data FROM product_images p
+        WHERE format = 'jpeg' AND width = (SELECT MAX(width) FROM product_images WHERE key = p.key AND format = 'jpeg')
+    '''):
+        groups.setdefault(hashlib.sha256(data).hexdigest(), []).append(key)
+    return {digest: sorted(keys) for digest, keys in groups.items() if len(keys) > 1}
+
+
+# Legacy base64 images still in products.image, as {digest: [product ids]} for copies shared by several products
+def duplicate_legacy_images(conn):
+    groups = {}
+    for product_id, image in conn.execute("SELECT id, image FROM products WHERE image IS NOT NULL"):
+        groups.setdefault(hashlib.sha256(image.encode()).hexdigest(), []).append(product_id)
+    return {digest: ids for digest, ids in groups.items() if len(ids) > 1}
+
+
+# Stored images no product points at any more, e.g. after a product was deleted or got a new image
+def orphaned_images(conn):
+    return conn.execute('''
+        SELECT COUNT(DISTINCT key), COALESCE(SUM(length(data)), 0) FROM product_images
+        WHERE key NOT IN (SELECT image_key FROM products WHERE image_key IS NOT NULL)
+    ''').fetchone()
+
+
+def report(path):
+    conn = get_connection(path)
+    page_size = pragma(conn, "page_size")
+    page_count = pragma(conn, "page_count")
+    free = pragma(conn, "freelist_count")
+    auto_vacuum = {0: "none", 1: "full", 2: "incremental"}[pragma(conn, "auto_vacuum")]
+    sizes = file_sizes(path)
+    print(f"== {path}: {format_bytes(sizes['db'])} + {format_bytes(sizes['wal'])} WAL, schema version "
+          f"{pragma(conn, 'user_version')}, {page_count} pages of {page_size} B, {free} free "
+          f"({format_bytes(free * page_size)}), auto_vacuum {auto_vacuum}")
+    usage = page_usage(conn)
+    print(f"{'table':<24} {'rows':>9} {'pages':>7} {'size':>10} {'unused':>10} {'blob bytes':>11}")
+    for table in table_names(conn):
+        rows = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+        pages, size, unused = usage.get(table, (0, 0, 0))
+        blobs = sum(conn.execute(f'SELECT COALESCE(SUM(length("{column}")), 0) FROM "{table}"').fetchone()[0]
+                    for column in BLOB_COLUMNS.get(table, []))
+        print(f"{table:<24} {rows:>9} {pages:>7} {format_bytes(size):>10} {format_bytes(unused):>10} "
+              f"{format_bytes(blobs) if blobs else '':>11}")
+    indexes = [(name, usage[name]) for name, in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' ORDER BY name") if name in usage]
+    for name, (pages, size, unused) in indexes:
+        print(f"  index {name:<36} {pages:>7} {format_bytes(size):>10}")
+
+    if path == PRODUCTS_DB:
+        duplicates = duplicate_images(conn)
+        legacy = duplicate_legacy_images(conn)
+        orphans, orphan_bytes = orphaned_images(conn)
+        print(f"Duplicate images: {sum(len(keys) - 1 for keys in duplicates.values())} redundant stored image(s), "
+              f"{sum(len(ids) - 1 for ids in legacy.values())} redundant legacy base64 copies")
+        print(f"Orphaned images: {orphans} ({format_bytes(orphan_bytes)}) no product uses")
+
+
+# Refresh the planner's statistics
+def analyze(path):
+    conn = get_connection(path)
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA optimize")
+    stats = conn.execute("SELECT COUNT(*) FROM sqlite_stat1").fetchone()[0]
+    print(f"{path}: analyzed, {stats} index statistics")
+
+
+# Give free pages back to the file system. The first run switches the database to incremental
+# auto-vacuum, which takes one full VACUUM; later runs only release the free pages
+def vacuum(path):
+    conn = get_connection(path)
+    free = pragma(conn, "freelist_count")
+    if pragma(conn, "auto_vacuum") != 2:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        print(f"{path}: switched to incremental auto-vacuum (full VACUUM)")
+    else:
+        conn.execute("PRAGMA incremental_vacuum").fetchall()
+        print(f"{path}: released {free} free page(s)")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+
+# Returns True when every check passes
+def integrity(path):
+    conn = get_connection(path)
+    ok = True
+    result = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+    if result != ["ok"]:
+        ok = False
+        print(f"{path}: integrity_check failed:")
+        for line in result[:20]:
+            print(f"  {line}")
+    violations = conn.execute("PRAGMA foreign_key_check").fetchall()
+    if violations:
+        ok = False
+        print(f"{path}: {len(violations)} foreign key violation(s), e.g. {violations[0]}")
+    if path == PRODUCTS_DB:
+        try:
+            # Compares the search index with the products it was built from
+            conn.execute("INSERT INTO products_fts (products_fts, rank) VALUES ('integrity-check', 1)")
+        except sqlite3.DatabaseError as e:
+            ok = False
+            print(f"{path}: search index does not match products ({e}); rebuild it with "
+                  "INSERT INTO products_fts (products_fts) VALUES ('rebuild')")
+    if ok:
+        print(f"{path}: integrity ok")
+    return ok
+
+
+# Point products at one copy of each duplicated image, delete the other copies and every orphaned
+# image, and drop legacy base64 copies of images that are already in the image store
+def dedupe(path=PRODUCTS_DB):
+    from product_management import bump_catalog_version
+    with transaction(path) as conn:
+        repointed = 0
+        redundant = []
+        for keys in duplicate_images(conn).values():
+            keep, others = keys[0], keys[1:]
+            for key in others:
+                repointed += conn.execute(
+                    "UPDATE products SET image_key = ? WHERE image_key = ?", (keep, key)).rowcount
+            redundant.extend(others)
+        conn.executemany("DELETE FROM product_images WHERE key = ?", [(key,) for key in redundant])
+        orphans = conn.execute('''
+            DELETE FROM product_images
+            WHERE key NOT IN (SELECT image_key FROM products WHERE image_key IS NOT NULL)
+        ''').rowcount
+        legacy = conn.execute(
+            "UPDATE products SET image = NULL WHERE image IS NOT NULL AND image_key IS NOT NULL").rowcount
+        if repointed or legacy:
+            bump_catalog_version(conn)
+    print(f"{path}: merged {len(redundant)} duplicate image(s) ({repointed} product(s) repointed), "
+          f"deleted {orphans} orphaned rendition(s), cleared {legacy} legacy base64 image(s)")
+
+
+# Run the app's hot read paths once and capture the SQL they execute, as [(label, sql)]
+def hot_queries(conn):
+    from product_management import fetch_products_page, fetch_facet_counts
+    from product_search import search_products
+    from cart_management import fetch_cart_products
+    from image_store import load_image, FULL_SIZE
+    from job_queue import claim_jobs
+
+    ids = [row[0] for row in conn.execute("SELECT id FROM products ORDER BY id LIMIT 5")] or [1]
+    key = (conn.execute("SELECT image_key FROM products WHERE image_key IS NOT NULL LIMIT 1").fetchone() or [""])[0]
+    name = (conn.execute("SELECT name FROM products LIMIT 1").fetchone() or ["shirt"])[0]
+    word = (name.split() or ["shirt"])[0]
+    calls = [
+        ("catalog first page", lambda: fetch_products_page(conn)),
+        ("catalog next page", lambda: fetch_products_page(conn, ids[-1])),
+        ("price sort, no filter", lambda: fetch_products_page(conn, None, sort="price_asc")),
+        ("price sort, no filter, next page", lambda: fetch_products_page(conn, (0.0, ids[-1]), sort="price_desc")),
+        ("in stock by price", lambda: fetch_products_page(conn, None, filters={"in_stock": True}, sort="price_asc")),
+        ("price range and color", lambda: fetch_products_page(
+            conn, None, filters={"min_price": 10000, "max_price": 50000, "colors": ["Black"]}, sort="price_desc")),
+        ("facet counts", lambda: fetch_facet_counts(conn, {"in_stock": True})),
+        ("search", lambda: search_products(conn, word)),
+        ("cart lines", lambda: fetch_cart_products(conn, ids)),
+        ("image rendition", lambda: load_image(conn, key, FULL_SIZE[0] // 2)),
+        ("claim jobs", lambda: claim_jobs(conn, "maintenance-check")),
+    ]
+    queries = []
+    for label, call in calls:
+        statements = []
+        conn.set_trace_callback(statements.append)
+        # Run inside a transaction that is rolled back, so write paths leave nothing behind
+        conn.execute("BEGIN")
+        try:
+            call()
+        finally:
+            conn.rollback()
+            conn.set_trace_callback(None)
+        # Statements on 'main'.'...' are the FTS module's own lookups, not the app's
+        queries.extend((label, sql) for sql in statements
+                       if sql.lstrip().upper().startswith(("SELECT", "WITH", "UPDATE")) and "'main'." not in sql)
+    return queries
+
+
+# Print the query plan of each hot query and flag full table scans that can't stop early, i.e. without
+# a LIMIT or with a sort in between, and scans of an index whose rows are then sorted for the ORDER BY in
+# a temp B-tree, which read and sort every row however small the LIMIT; returns the number flagged
+def plans(path=PRODUCTS_DB):
+    if path == USERS_DB:
+        queries = [("login", "SELECT id, username, password, is_admin FROM users WHERE username = 'x' AND password = 'y'")]
+        conn = get_connection(path)
+    else:
+        conn = get_connection(path)
+        queries = hot_queries(conn)
+    tables = set(table_names(conn))
+    flagged = 0
+    for label, sql in queries:
+        details = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+        table_scans = [d for d in details if d.startswith("SCAN ") and d.split()[1] in tables]
+        stops_early = " LIMIT " in sql.upper() and not any("TEMP B-TREE" in d for d in details)
+        if any("USING" not in d for d in table_scans) and not stops_early:
+            verdict = "SCAN"
+        elif table_scans and any("TEMP B-TREE" in d and "ORDER BY" in d for d in details):
+            verdict = "SORT"
+        else:
+            verdict = " ok "
+        flagged += verdict != " ok "
+        print(f"[{verdict}] {label}")
+        for detail in details:
+            print(f"         {detail}")
+    return flagged
+
+
+COMMANDS = ("report", "analyze", "vacuum", "integrity", "dedupe", "plans", "all")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and maintain products.db and users.db.")
+    parser.add_argument("command", nargs="?", default="report", choices=COMMANDS,
+                        help="report (default); all runs integrity, dedupe, analyze, vacuum, plans and report")
+    parser.add_argument("--db", action="append", choices=(PRODUCTS_DB, USERS_DB),
+                        help="database to work on (repeatable; default both)")
+    args = parser.parse_args(argv)
+    paths = args.db or [PRODUCTS_DB, USERS_DB]
+
+    migrate_all()
+    before = {path: file_sizes(path) for path in paths}
+    failed = False
+    for path in paths:
+        if args.command in ("integrity", "all"):
+            failed |= not integrity(path)
+        if args.command in ("dedupe", "all") and path == PRODUCTS_DB:
+            dedupe(path)
+        if args.command in ("analyze", "all"):
+            analyze(path)
+        if args.command in ("vacuum", "all"):
+            vacuum(path)
+        if args.command in ("plans", "all"):
+            failed |= bool(plans(path))
+        if args.command in ("report", "all"):
+            report(path)
+    if args.command in ("analyze", "vacuum", "dedupe", "all"):
+        for path in paths:
+            get_connection(path).execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+            print_sizes(path, before[path], file_sizes(path))
+    close_all()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
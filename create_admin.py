@@ -1,12 +1,17 @@
 import sqlite3
+from db_init import transaction, close_all, USERS_DB
+from migrations import migrate
 
+# Bring users.db up to date first, so the users table and its is_admin column exist
 def create_admin_user(username='AdminUser'):
-    conn = sqlite3.connect('users.db')
-    cursor = conn.cursor()
-    cursor.execute("INSERT INTO users (username, password, is_admin) VALUES (?, ?, ?)", (username, 'adminpassword', True))
-    conn.commit()
-    conn.close()
-    print(f"Admin user '{username}' created successfully!")
+    migrate(USERS_DB)
+    try:
+        with transaction(USERS_DB) as conn:
+            conn.execute("INSERT INTO users (username, password, is_admin) VALUES (?, ?, ?)", (username, 'adminpassword', True))
+        print(f"Admin user '{username}' created successfully!")
+    except sqlite3.IntegrityError:
+        print(f"User '{username}' already exists.")
+    close_all()
 
 if __name__ == "__main__":
     create_admin_user()
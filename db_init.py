@@ -0,0 +1,112 @@
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+
+PRODUCTS_DB = 'products.db'
+USERS_DB = 'users.db'
+
+# Milliseconds a connection waits on a lock held by another writer before failing
+BUSY_TIMEOUT_MS = 5000
+
+# Applied to every new connection; journal_mode=WAL lets readers proceed while an admin writes
+PRAGMAS = [
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("busy_timeout", BUSY_TIMEOUT_MS),
+    ("cache_size", -8000),       # KiB, i.e. about 8 MB of page cache per connection
+    ("mmap_size", 268435456),    # 256 MB of memory-mapped reads
+    ("temp_store", "MEMORY"),
+]
+
+# Idle connections kept per database once their thread has finished
+MAX_IDLE_CONNECTIONS = 8
+
+_lock = threading.Lock()
+_idle = {}
+_local = threading.local()
+_after_commit = {}
+
+
+def _open_connection(path):
+    # Each connection is owned by one thread at a time, but it may be handed
+    # to a different thread after its first owner exits
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000,
+                           check_same_thread=False, isolation_level=None)
+    for name, value in PRAGMAS:
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+# Return a thread's connections to the idle pool when the thread goes away
+def _release(connections):
+    with _lock:
+        for path, conn in connections.items():
+            if conn.in_transaction:
+                conn.rollback()
+            idle = _idle.setdefault(path, [])
+            if len(idle) < MAX_IDLE_CONNECTIONS:
+                idle.append(conn)
+            else:
+                conn.close()
+
+
+# Get the calling thread's connection to a database, reusing a pooled one if possible
+def get_connection(path=PRODUCTS_DB):
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+        weakref.finalize(threading.current_thread(), _release, connections)
+    conn = connections.get(path)
+    if conn is None:
+        with _lock:
+            idle = _idle.get(path)
+            conn = idle.pop() if idle else None
+        if conn is None:
+            conn = _open_connection(path)
+        connections[path] = conn
+    return conn
+
+
+# Run a block in one transaction on the thread's connection; commits on success, rolls back on error.
+# Writers should use immediate=True so the write lock is taken up front instead of failing mid-way.
+# Nested blocks join the outer transaction.
+@contextmanager
+def transaction(path=PRODUCTS_DB, immediate=True):
+    conn = get_connection(path)
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        _after_commit.pop(conn, None)
+        raise
+    else:
+        conn.commit()
+        for callback in _after_commit.pop(conn, []):
+            callback()
+
+
+# Run a callback once the connection's current transaction commits (at once if none is open),
+# so in-memory caches never get ahead of what other connections can read
+def after_commit(conn, callback):
+    if conn.in_transaction:
+        _after_commit.setdefault(conn, []).append(callback)
+    else:
+        callback()
+
+
+# Close every pooled connection (used by command-line scripts before exiting)
+def close_all():
+    connections = getattr(_local, "connections", None) or {}
+    with _lock:
+        for conn in connections.values():
+            conn.close()
+        connections.clear()
+        for idle in _idle.values():
+            for conn in idle:
+                conn.close()
+        _idle.clear()
@@ -0,0 +1,95 @@
+import threading
+from collections import OrderedDict
+from image_store import load_image
+from perf import timed
+
+# Default budget for cached image bytes shared by all sessions
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+# Process-wide LRU of image bytes keyed by (product id, image version, rendition)
+class ImageCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, product_id, version, variant, loader):
+        key = (product_id, version, variant)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+            self.misses += 1
+        data = loader()
+        if data is not None:
+            self.put(key, data)
+        return data
+
+    def put(self, key, data):
+        size = len(data)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= len(old)
+            self._entries[key] = data
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted)
+                self.evictions += 1
+
+    # Drop every cached variant of a product, whatever its version
+    def invalidate(self, product_id):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == product_id]:
+                self.current_bytes -= len(self._entries.pop(key))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+image_cache = ImageCache()
+
+
+# Load the smallest rendition of a product image at least width pixels wide through the shared cache
+@timed("image_cache.get_product_image")
+def get_product_image(conn, product_id, image_key, width, fmt="jpeg"):
+    if not image_key:
+        return None
+    return image_cache.get(int(product_id), image_key, (fmt, width), lambda: load_image(conn, image_key, width, fmt))
+
+
+# Load a rendition by image key alone, for callers that don't know the product such as the JSON API.
+# Keys are content hashes, so these entries never need invalidating
+@timed("image_cache.get_image")
+def get_image(conn, image_key, width, fmt="jpeg"):
+    return image_cache.get(None, image_key, (fmt, width), lambda: load_image(conn, image_key, width, fmt))
+
+
+# Called by the admin update and delete paths; ids arrive as str from the selectboxes
+def invalidate_product(product_id):
+    image_cache.invalidate(int(product_id))
@@ -0,0 +1,176 @@
+import base64
+import hashlib
+import io
+import os
+import sys
+from PIL import Image, features
+from db_init import transaction, close_all
+from perf import timed
+
+# Size every uploaded product image is standardized to
+FULL_SIZE = (600, 600)
+
+# Widths of the renditions generated once at upload time; render sites pick the smallest that fits
+WIDTHS = (100, 200, 400, FULL_SIZE[0])
+
+# Formats encoded for every width, e.g. EHOME_IMAGE_FORMATS=avif,webp,jpeg. JPEG is always kept as
+# the fallback, and formats this Pillow build cannot write are skipped
+FORMATS_ENV = "EHOME_IMAGE_FORMATS"
+KNOWN_FORMATS = ("avif", "webp", "jpeg")
+
+
+# Formats named in EHOME_IMAGE_FORMATS, warning about the ones that can't be used
+def _configured_formats(value):
+    formats = []
+    for fmt in value.lower().split(","):
+        fmt = fmt.strip()
+        if not fmt or fmt in formats:
+            continue
+        if fmt not in KNOWN_FORMATS:
+            print(f"{FORMATS_ENV}: ignoring unknown image format {fmt!r}; use {', '.join(KNOWN_FORMATS)}",
+                  file=sys.stderr)
+        elif fmt != "jpeg" and not features.check(fmt):
+            print(f"{FORMATS_ENV}: ignoring {fmt!r}, which this Pillow build cannot write", file=sys.stderr)
+        else:
+            formats.append(fmt)
+    if "jpeg" not in formats:
+        formats.append("jpeg")
+    return formats
+
+
+FORMATS = _configured_formats(os.environ.get(FORMATS_ENV, "webp,jpeg"))
+
+# Encoder quality per format, overridable with EHOME_JPEG_QUALITY, EHOME_WEBP_QUALITY, EHOME_AVIF_QUALITY
+QUALITY = {
+    "jpeg": int(os.environ.get("EHOME_JPEG_QUALITY", 82)),
+    "webp": int(os.environ.get("EHOME_WEBP_QUALITY", 80)),
+    "avif": int(os.environ.get("EHOME_AVIF_QUALITY", 60)),
+}
+
+
+# Create the image table and the products.image_key column if missing
+def init_image_store(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS product_images (
+            key TEXT NOT NULL,
+            variant TEXT NOT NULL,
+            format TEXT NOT NULL DEFAULT 'jpeg',
+            width INTEGER NOT NULL,
+            height INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            PRIMARY KEY (key, variant)
+        )
+    ''')
+    # Images stored before renditions had a format are the JPEG thumb, card and full variants
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(product_images)")]
+    if "format" not in columns:
+        cursor.execute("ALTER TABLE product_images ADD COLUMN format TEXT NOT NULL DEFAULT 'jpeg'")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_product_images_rendition ON product_images (key, format, width)")
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(products)")]
+    if "image_key" not in columns:
+        cursor.execute("ALTER TABLE products ADD COLUMN image_key TEXT")
+
+
+# Flatten transparency onto white and make sure the image can be saved as JPEG
+def _to_rgb(img):
+    if img.mode in ("RGBA", "LA"):
+        background = Image.new(img.mode[:-1], img.size, (255, 255, 255))
+        background.paste(img, img.split()[-1])
+        img = background
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    return img
+
+
+def _encode(img, fmt):
+    buffered = io.BytesIO()
+    if fmt == "jpeg":
+        # Progressive JPEGs are smaller at these sizes and show a preview while loading
+        img.save(buffered, format="JPEG", quality=QUALITY["jpeg"], optimize=True, progressive=True)
+    elif fmt == "webp":
+        img.save(buffered, format="WEBP", quality=QUALITY["webp"], method=4)
+    else:
+        img.save(buffered, format="AVIF", quality=QUALITY["avif"], speed=6)
+    return buffered.getvalue()
+
+
+def variant_name(fmt, width):
+    return f"{fmt}-{width}"
+
+
+# Build every rendition of an image; returns (key, {variant: (format, width, height, bytes)})
+@timed("image_store.build_variants")
+def build_variants(img):
+    img = _to_rgb(img)
+    if img.size != FULL_SIZE:
+        img = img.resize(FULL_SIZE, Image.LANCZOS)
+    full = _encode(img, "jpeg")
+    key = hashlib.sha256(full).hexdigest()
+    variants = {}
+    for width in WIDTHS:
+        resized = img
+        if width != img.width:
+            resized = img.copy()
+            resized.thumbnail((width, width), Image.LANCZOS)
+        for fmt in FORMATS:
+            data = full if resized is img and fmt == "jpeg" else _encode(resized, fmt)
+            variants[variant_name(fmt, width)] = (fmt, resized.width, resized.height, data)
+    return key, variants
+
+
+# Write variants built by build_variants; identical images are stored once
+def store_variants(conn, key, variants):
+    conn.executemany(
+        "INSERT OR IGNORE INTO product_images (key, variant, format, width, height, data) VALUES (?, ?, ?, ?, ?, ?)",
+        [(key, variant, fmt, w, h, data) for variant, (fmt, w, h, data) in variants.items()]
+    )
+    return key
+
+
+# Store an image and return its content key
+def save_image(conn, img):
+    key, variants = build_variants(img)
+    return store_variants(conn, key, variants)
+
+
+# Fetch the smallest rendition in the given format that is at least width pixels wide (the largest
+# one if none is), or None if the key has no image in that format. The rendition is chosen from the
+# covering index so only the returned image's bytes are read
+@timed("image_store.load_image")
+def load_image(conn, key, width, fmt="jpeg"):
+    if not key:
+        return None
+    row = conn.execute('''
+        SELECT data FROM product_images WHERE rowid = (
+            SELECT rowid FROM product_images WHERE key = ? AND format = ?
+            ORDER BY width < ?, abs(width - ?) LIMIT 1
+        )
+    ''', (key, fmt, width, width)).fetchone()
+    return row[0] if row else None
+
+
+
+# Move legacy base64 images out of products.image into the image store
+def migrate_product_images(conn):
+    cursor = conn.cursor()
+    rows = cursor.execute(
+        "SELECT id, image FROM products WHERE image IS NOT NULL AND image_key IS NULL"
+    ).fetchall()
+    for product_id, image_base64 in rows:
+        try:
+            img = Image.open(io.BytesIO(base64.b64decode(image_base64)))
+            key = save_image(conn, img)
+        except (OSError, ValueError) as e:
+            print(f"Skipping image of product {product_id}: {e}")
+            continue
+        cursor.execute("UPDATE products SET image_key = ?, image = NULL WHERE id = ?", (key, product_id))
+    return len(rows)
+
+
+if __name__ == "__main__":
+    with transaction() as conn:
+        init_image_store(conn)
+        migrated = migrate_product_images(conn)
+    print(f"Migrated {migrated} product image(s) to the image store")
+    close_all()
@@ -0,0 +1,261 @@
+import argparse
+import csv
+import io
+import json
+import math
+import os
+import sqlite3
+import sys
+import time
+import zipfile
+from urllib.parse import quote
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+from db_init import transaction, close_all, PRODUCTS_DB
+from image_store import build_variants, store_variants
+from init_db import initialize_db
+from product_management import bump_catalog_version
+
+# Manifest columns; only name and price are required
+FIELDS = ["sku", "name", "price", "available", "description", "color", "size", "image"]
+
+TRUE_VALUES = {"1", "true", "yes", "y", "on"}
+FALSE_VALUES = {"0", "false", "no", "n", "off"}
+
+# Processed images written per transaction while the pool keeps encoding
+IMAGE_BATCH = 32
+
+# Opened once per worker process when images come from a ZIP archive
+_archive = None
+
+
+# Read a CSV or JSON (list of objects) manifest into a list of dicts
+def read_manifest(path):
+    if path.lower().endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            rows = json.load(f)
+        if not isinstance(rows, list):
+            raise ValueError("JSON manifest must be a list of product objects")
+        return rows
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return list(csv.DictReader(f))
+
+
+# A blank cell or missing value means the default, like a missing column
+def _parse_bool(value, default=True):
+    if isinstance(value, bool):
+        return value
+    text = str(value if value is not None else "").strip().lower()
+    if not text:
+        return default
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError(f"not a yes/no value: {value!r}")
+
+
+def _text(value):
+    text = str(value).strip() if value is not None else ""
+    return text or None
+
+
+# Validate manifest rows; returns (products, errors) where errors are (line, message)
+def validate_rows(rows):
+    products, errors = [], []
+    seen_skus = set()
+    for line, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append((line, f"expected a product object, got {type(row).__name__}"))
+            continue
+        try:
+            name = _text(row.get("name"))
+            if not name:
+                raise ValueError("name is required")
+            price = float(row.get("price"))
+            if not math.isfinite(price):
+                raise ValueError(f"price must be a number, got {row.get('price')!r}")
+            if price < 0:
+                raise ValueError("price must not be negative")
+            available = _parse_bool(row.get("available"))
+        except (TypeError, ValueError) as e:
+            errors.append((line, str(e)))
+            continue
+        sku = _text(row.get("sku"))
+        if sku in seen_skus:
+            errors.append((line, f"duplicate sku {sku!r} in manifest"))
+            continue
+        if sku:
+            seen_skus.add(sku)
+        products.append({
+            "sku": sku,
+            "name": name,
+            "price": price,
+            "available": available,
+            "description": _text(row.get("description")),
+            "color": _text(row.get("color")),
+            "size": _text(row.get("size")),
+            "image": _text(row.get("image")),
+        })
+    return products, errors
+
+
+def _init_worker(images):
+    global _archive
+    if images and zipfile.is_zipfile(images):
+        _archive = zipfile.ZipFile(images)
+
+
+# Runs in a worker process: open, standardize and encode every variant of one image
+def _process_image(task):
+    images, name = task
+    if _archive is not None:
+        data = _archive.read(name)
+    else:
+        with open(os.path.join(images, name), "rb") as f:
+            data = f.read()
+    return build_variants(Image.open(io.BytesIO(data)))
+
+
+# Names of the images the manifest refers to that cannot be found
+def missing_images(products, images):
+    names = {p["image"] for p in products if p["image"]}
+    if not names:
+        return []
+    if not images:
+        return sorted(names)
+    if zipfile.is_zipfile(images):
+        with zipfile.ZipFile(images) as archive:
+            available = set(archive.namelist())
+        return sorted(names - available)
+    return sorted(n for n in names if not os.path.isfile(os.path.join(images, n)))
+
+
+# Write a batch of processed images in one short transaction
+def _store_batch(batch):
+    with transaction(PRODUCTS_DB) as conn:
+        for key, variants in batch:
+            store_variants(conn, key, variants)
+
+
+# Resize and encode every distinct image in a process pool, storing the variants in batches of
+# IMAGE_BATCH as results arrive; returns {image name: key}. Images are stored under their content
+# key with INSERT OR IGNORE, so a rerun after a failed import stores nothing twice; images a failed
+# run left without products show up as orphans in check_users_db.py
+def process_images(products, images, workers=None, progress=True):
+    names = sorted({p["image"] for p in products if p["image"]})
+    keys = {}
+    if not names:
+        return keys
+    started = time.monotonic()
+    batch = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(images,)) as executor:
+        chunksize = max(1, len(names) // ((workers or os.cpu_count() or 1) * 4))
+        for done, (name, (key, variants)) in enumerate(
+                zip(names, executor.map(_process_image, [(images, n) for n in names], chunksize=chunksize)), start=1):
+            keys[name] = key
+            batch.append((key, variants))
+            if len(batch) >= IMAGE_BATCH:
+                _store_batch(batch)
+                batch = []
+            if progress and (done % 50 == 0 or done == len(names)):
+                rate = done / max(time.monotonic() - started, 1e-9)
+                print(f"\rProcessed {done}/{len(names)} images ({rate:.0f}/s)", end="", file=sys.stderr, flush=True)
+    if batch:
+        _store_batch(batch)
+    if progress:
+        print(file=sys.stderr)
+    return keys
+
+
+# Count how many manifest rows would update existing products (matched by sku)
+def count_existing(conn, products):
+    skus = [p["sku"] for p in products if p["sku"]]
+    existing = 0
+    # Stay under SQLite's bound-parameter limit
+    for start in range(0, len(skus), 500):
+        chunk = skus[start:start + 500]
+        existing += conn.execute(
+            f"SELECT COUNT(*) FROM products WHERE sku IN ({', '.join('?' for _ in chunk)})", chunk
+        ).fetchone()[0]
+    return existing
+
+
+# count_existing for a dry run: products.db is opened read-only, so a dry run never creates or migrates it
+def count_existing_readonly(products):
+    if not os.path.exists(PRODUCTS_DB):
+        return 0
+    conn = sqlite3.connect(f"file:{quote(os.path.abspath(PRODUCTS_DB))}?mode=ro", uri=True)
+    try:
+        # Before the sku migration no product can match by sku
+        if "sku" not in {row[1] for row in conn.execute("PRAGMA table_info(products)")}:
+            return 0
+        return count_existing(conn, products)
+    finally:
+        conn.close()
+
+
+# Write the products in one transaction; rows with a known sku are updated in place.
+# image_keys maps image names to the keys process_images stored them under
+def write_products(products, image_keys):
+    rows = []
+    for p in products:
+        image_key = image_keys[p["image"]] if p["image"] else None
+        rows.append((p["sku"], p["name"], p["price"], p["available"], image_key,
+                     p["description"], p["color"], p["size"]))
+    with transaction(PRODUCTS_DB) as conn:
+        conn.executemany('''
+            INSERT INTO products (sku, name, price, available, image_key, description, color, size)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (sku) DO UPDATE SET
+                name = excluded.name,
+                price = excluded.price,
+                available = excluded.available,
+                image_key = COALESCE(excluded.image_key, products.image_key),
+                description = excluded.description,
+                color = excluded.color,
+                size = excluded.size
+        ''', rows)
+        bump_catalog_version(conn)
+    return len(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import products from a CSV or JSON manifest.")
+    parser.add_argument("manifest", help="CSV or JSON file with columns: " + ", ".join(FIELDS))
+    parser.add_argument("--images", help="directory or ZIP archive holding the files named in the image column")
+    parser.add_argument("--workers", type=int, default=None, help="image processes (default: one per CPU)")
+    parser.add_argument("--dry-run", action="store_true", help="validate the manifest and images without writing")
+    args = parser.parse_args(argv)
+
+    started = time.monotonic()
+    products, errors = validate_rows(read_manifest(args.manifest))
+    for line, message in errors:
+        print(f"Row {line}: {message}", file=sys.stderr)
+    missing = missing_images(products, args.images)
+    for name in missing:
+        print(f"Missing image: {name}", file=sys.stderr)
+    if errors or missing:
+        print(f"Aborting: {len(errors)} invalid row(s), {len(missing)} missing image(s)", file=sys.stderr)
+        return 1
+
+    if args.dry_run:
+        existing = count_existing_readonly(products)
+        print(f"{len(products)} product(s): {len(products) - existing} new, {existing} updated by sku")
+        print("Dry run: nothing written")
+        return 0
+    conn = initialize_db()
+    if conn is None:
+        return 1
+    existing = count_existing(conn, products)
+    print(f"{len(products)} product(s): {len(products) - existing} new, {existing} updated by sku")
+
+    image_keys = process_images(products, args.images, args.workers)
+    written = write_products(products, image_keys)
+    print(f"Imported {written} product(s) and {len(image_keys)} image(s) in {time.monotonic() - started:.1f}s")
+    close_all()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,23 +1,14 @@
 import sqlite3
+from db_init import get_connection, close_all, PRODUCTS_DB
+from migrations import migrate_all
 
+# Bring products.db and users.db up to date and return this thread's products.db connection
 def initialize_db():
     try:
-        conn = sqlite3.connect('products.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS products (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                price REAL NOT NULL,
-                available BOOLEAN NOT NULL,
-                image TEXT,
-                description TEXT,
-                color TEXT,
-                size TEXT
-            )
-        ''')
-        conn.commit()
-        return conn
+        for path, applied in migrate_all().items():
+            if applied:
+                print(f"Applied {len(applied)} migration(s) to {path}")
+        return get_connection(PRODUCTS_DB)
     except sqlite3.Error as e:
         print(f"Database error: {e}")
         return None
@@ -28,3 +19,4 @@ if __name__ == "__main__":
         print("Database initialized successfully")
     else:
         print("Failed to initialize database")
+    close_all()
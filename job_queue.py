@@ -0,0 +1,108 @@
+import socket
+import os
+import time
+
+# Job kinds
+PRODUCT_IMAGE = "product_image"        # payload: the uploaded file; sets products.image_key
+REENCODE_IMAGE = "reencode_image"      # re-encode one product's stored image with the current settings
+REENCODE_CATALOG = "reencode_catalog"  # fans out into one reencode_image job per product
+
+# Attempts before a job is marked failed
+MAX_ATTEMPTS = 3
+# Running jobs not finished within this many seconds are assumed lost with their worker and retried
+LEASE_SECONDS = 300
+
+
+# Create the durable job table in products.db
+def init_job_queue(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            product_id INTEGER,
+            payload BLOB,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            worker TEXT,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id)")
+    # Finds a product's latest job for the catalog cards
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_product ON jobs (product_id, kind, id)")
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+# Queue a job; call inside the transaction that makes the change it belongs to
+def enqueue(conn, kind, product_id=None, payload=None):
+    cursor = conn.execute(
+        "INSERT INTO jobs (kind, product_id, payload, created_at) VALUES (?, ?, ?, ?)",
+        (kind, product_id, payload, time.time())
+    )
+    return cursor.lastrowid
+
+
+# Atomically mark up to limit queued jobs as running for this worker and return them
+# as (id, kind, product_id, payload, attempts); call inside an immediate transaction
+def claim_jobs(conn, worker, limit=8):
+    rows = conn.execute('''
+        UPDATE jobs SET status = 'running', worker = ?, started_at = ?, attempts = attempts + 1
+        WHERE id IN (SELECT id FROM jobs WHERE status = 'queued' ORDER BY id LIMIT ?)
+        RETURNING id, kind, product_id, payload, attempts
+    ''', (worker, time.time(), limit)).fetchall()
+    return sorted(rows)
+
+
+# Put jobs whose worker went away back in the queue
+def requeue_stale(conn, lease_seconds=LEASE_SECONDS):
+    return conn.execute(
+        "UPDATE jobs SET status = 'queued', worker = NULL WHERE status = 'running' AND started_at < ?",
+        (time.time() - lease_seconds,)
+    ).rowcount
+
+
+# Mark a job done and drop its payload, which is no longer needed
+def complete_job(conn, job_id):
+    conn.execute(
+        "UPDATE jobs SET status = 'done', payload = NULL, error = NULL, finished_at = ? WHERE id = ?",
+        (time.time(), job_id)
+    )
+
+
+# Record a failure; the job is retried until it has used MAX_ATTEMPTS, then its payload is dropped
+def fail_job(conn, job_id, attempts, error):
+    status = "failed" if attempts >= MAX_ATTEMPTS else "queued"
+    conn.execute(
+        "UPDATE jobs SET status = ?, error = ?, finished_at = ?, "
+        "payload = CASE WHEN ? = 'failed' THEN NULL ELSE payload END WHERE id = ?",
+        (status, str(error)[:500], time.time(), status, job_id)
+    )
+
+
+# Status of the latest job of a kind for each of the given products, as {product_id: status}
+def latest_job_status(conn, product_ids, kind=PRODUCT_IMAGE):
+    if not product_ids:
+        return {}
+    placeholders = ", ".join("?" for _ in product_ids)
+    return dict(conn.execute(f'''
+        SELECT product_id, status FROM jobs WHERE id IN (
+            SELECT MAX(id) FROM jobs WHERE product_id IN ({placeholders}) AND kind = ? GROUP BY product_id
+        )
+    ''', [int(product_id) for product_id in product_ids] + [kind]).fetchall())
+
+
+def job_counts(conn):
+    return dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+
+def recent_jobs(conn, limit=20):
+    return conn.execute('''
+        SELECT id, kind, product_id, status, attempts, error, created_at, finished_at
+        FROM jobs ORDER BY id DESC LIMIT ?
+    ''', (limit,)).fetchall()
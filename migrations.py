@@ -0,0 +1,111 @@
+from db_init import get_connection, transaction, close_all, PRODUCTS_DB, USERS_DB
+from image_store import init_image_store, migrate_product_images
+from product_management import init_catalog_meta, init_catalog_indexes, init_product_sku, bump_catalog_version
+from product_search import init_search_index
+from job_queue import init_job_queue
+from order_management import init_orders
+from cart_store import init_cart_store
+
+
+def create_products(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            price REAL NOT NULL,
+            available BOOLEAN NOT NULL,
+            image TEXT,
+            description TEXT,
+            color TEXT,
+            size TEXT
+        )
+    ''')
+
+
+def move_images_to_store(conn):
+    if migrate_product_images(conn):
+        bump_catalog_version(conn)
+
+
+def create_users(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL UNIQUE,
+            password TEXT NOT NULL,
+            is_admin BOOLEAN NOT NULL DEFAULT 0
+        )
+    ''')
+
+
+# Users tables created before admins existed lack is_admin
+def add_users_is_admin(conn):
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(users)")]
+    if "is_admin" not in columns:
+        conn.execute("ALTER TABLE users ADD COLUMN is_admin BOOLEAN NOT NULL DEFAULT 0")
+
+
+# Ordered migrations per database; PRAGMA user_version holds how many have been applied.
+# Only ever append. Every step tolerates finding its change already made, because databases set up
+# by the scripts that came before this runner start at version 0 with some of the schema in place
+MIGRATIONS = {
+    PRODUCTS_DB: [
+        ("create products table", create_products),
+        ("image store and products.image_key", init_image_store),
+        ("catalog version table", init_catalog_meta),
+        ("catalog filter and sort indexes", init_catalog_indexes),
+        ("products.sku with unique index", init_product_sku),
+        ("full-text search index", init_search_index),
+        ("background job queue", init_job_queue),
+        ("stock, orders and order items", init_orders),
+        ("saved carts", init_cart_store),
+        ("move base64 images into the image store", move_images_to_store),
+        # Reruns the catalog index step for databases migrated before it created idx_products_price
+        ("products.price index for unfiltered price sorts", init_catalog_indexes),
+        # Reruns the job queue step for databases migrated before it created idx_jobs_product
+        ("jobs by product index", init_job_queue),
+    ],
+    USERS_DB: [
+        ("create users table", create_users),
+        ("users.is_admin", add_users_is_admin),
+    ],
+}
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+# Bring a database up to date; returns the names of the migrations applied.
+# A current database costs a single PRAGMA read. Otherwise the pending migrations run in one
+# BEGIN IMMEDIATE transaction, so a failure leaves the database as it was and two processes
+# starting at once don't both migrate
+def migrate(path=PRODUCTS_DB):
+    migrations = MIGRATIONS[path]
+    if schema_version(get_connection(path)) >= len(migrations):
+        return []
+    with transaction(path) as conn:
+        current = schema_version(conn)
+        pending = migrations[current:]
+        for name, step in pending:
+            step(conn)
+        if pending:
+            conn.execute(f"PRAGMA user_version = {len(migrations)}")
+    return [name for name, step in pending]
+
+
+# Migrate every database; returns {path: names of the migrations applied}
+def migrate_all():
+    return {path: migrate(path) for path in MIGRATIONS}
+
+
+if __name__ == "__main__":
+    for path, applied in migrate_all().items():
+        version = schema_version(get_connection(path))
+        if applied:
+            print(f"{path}: applied {len(applied)} migration(s), now at version {version}")
+            for name in applied:
+                print(f"  - {name}")
+        else:
+            print(f"{path}: up to date at version {version}")
+    close_all()
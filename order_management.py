@@ -0,0 +1,138 @@
+import time
+from db_init import transaction, PRODUCTS_DB
+from product_management import bump_catalog_version
+from perf import timed
+
+
+# Create the stock, orders and order_items tables. Products without a stock row are not
+# inventory-tracked and sell while they are available
+def init_orders(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stock (
+            product_id INTEGER PRIMARY KEY,
+            quantity INTEGER NOT NULL CHECK (quantity >= 0)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT,
+            total REAL NOT NULL,
+            created_at REAL NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS order_items (
+            order_id INTEGER NOT NULL REFERENCES orders (id),
+            product_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            price REAL NOT NULL,
+            PRIMARY KEY (order_id, product_id)
+        )
+    ''')
+
+
+# Set a product's stock level (None stops tracking it); call inside a transaction.
+# Availability follows tracked stock: none left makes the product unavailable, and restocking a
+# sold-out product makes it available again, unless the caller passes the availability it has just
+# set itself (an admin may keep a restocked product hidden)
+def set_stock(conn, product_id, quantity, available=None):
+    if quantity is None:
+        conn.execute("DELETE FROM stock WHERE product_id = ?", (product_id,))
+        return
+    previous = get_stock(conn, product_id)
+    conn.execute(
+        "INSERT INTO stock (product_id, quantity) VALUES (?, ?) "
+        "ON CONFLICT (product_id) DO UPDATE SET quantity = excluded.quantity",
+        (product_id, int(quantity))
+    )
+    if quantity == 0 or (previous == 0 and available is None):
+        in_stock = int(quantity > 0)
+        changed = conn.execute("UPDATE products SET available = ? WHERE id = ? AND available != ?",
+                               (in_stock, product_id, in_stock)).rowcount
+        if changed:
+            bump_catalog_version(conn)
+
+
+def get_stock(conn, product_id):
+    row = conn.execute("SELECT quantity FROM stock WHERE product_id = ?", (product_id,)).fetchone()
+    return row[0] if row else None
+
+
+# The cart as a VALUES table, shared by every statement of a checkout
+def _cart_cte(cart):
+    values = ", ".join("(?, ?)" for _ in cart)
+    params = [value for product_id, quantity in cart.items() for value in (int(product_id), int(quantity))]
+    return f"WITH cart (product_id, quantity) AS (VALUES {values})", params
+
+
+# Place an order for a {product_id: quantity} cart in one BEGIN IMMEDIATE transaction.
+# Stock for the whole cart is checked in one query and decremented in one statement, so concurrent
+# checkouts can never sell more than is in stock. Lines for products deleted since they were added are
+# left out. Returns (order_id, problems): order_id is None and problems lists what is wrong with the
+# cart when nothing was ordered
+@timed("db.checkout")
+def checkout(cart, username=None, path=PRODUCTS_DB):
+    cart = {product_id: quantity for product_id, quantity in cart.items() if quantity > 0}
+    if not cart:
+        return None, ["Your cart is empty."]
+    cte, params = _cart_cte(cart)
+    with transaction(path) as conn:
+        rows = conn.execute(f'''
+            {cte}
+            SELECT cart.product_id, cart.quantity, p.name, p.price, p.available, s.quantity
+            FROM cart
+            LEFT JOIN products p ON p.id = cart.product_id
+            LEFT JOIN stock s ON s.product_id = cart.product_id
+        ''', params).fetchall()
+        problems = []
+        deleted = set()
+        total = 0.0
+        for product_id, quantity, name, price, available, in_stock in rows:
+            if name is None:
+                deleted.add(product_id)
+            elif not available:
+                problems.append(f"{name} is out of stock.")
+            elif in_stock is not None and in_stock < quantity:
+                problems.append(f"Only {in_stock} of {name} left in stock.")
+            else:
+                total += price * quantity
+        if problems:
+            return None, problems
+        if deleted:
+            cart = {product_id: quantity for product_id, quantity in cart.items() if int(product_id) not in deleted}
+            if not cart:
+                return None, ["Your cart is empty."]
+            cte, params = _cart_cte(cart)
+
+        sold_out = [row[0] for row in conn.execute(f'''
+            {cte}
+            UPDATE stock SET quantity = stock.quantity - cart.quantity
+            FROM cart WHERE stock.product_id = cart.product_id
+            RETURNING stock.product_id, stock.quantity
+        ''', params) if row[1] == 0]
+
+        order_id = conn.execute(
+            "INSERT INTO orders (username, total, created_at) VALUES (?, ?, ?)",
+            (username, total, time.time())
+        ).lastrowid
+        conn.execute(f'''
+            {cte}
+            INSERT INTO order_items (order_id, product_id, quantity, price)
+            SELECT ?, cart.product_id, cart.quantity, p.price FROM cart JOIN products p ON p.id = cart.product_id
+        ''', params + [order_id])
+
+        # Sold-out products drop out of the in-stock catalog
+        if sold_out:
+            conn.execute(
+                f"UPDATE products SET available = 0 WHERE id IN ({', '.join('?' for _ in sold_out)})", sold_out)
+            bump_catalog_version(conn)
+    return order_id, []
+
+
+def recent_orders(conn, limit=20):
+    return conn.execute('''
+        SELECT o.id, o.username, o.total, SUM(i.quantity), o.created_at
+        FROM orders o JOIN order_items i ON i.order_id = o.id
+        GROUP BY o.id ORDER BY o.id DESC LIMIT ?
+    ''', (limit,)).fetchall()
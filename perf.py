@@ -0,0 +1,111 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Most recent samples kept per span name for the percentiles
+SAMPLES_PER_SPAN = 2000
+
+# Set EHOME_PERF_LOG to a file path to also append every sample there as a JSON line
+LOG_PATH_ENV = "EHOME_PERF_LOG"
+
+_lock = threading.Lock()
+_samples = {}
+_counts = {}
+_totals = {}
+_log_file = None
+_log_path = os.environ.get(LOG_PATH_ENV) or None
+
+
+# Append samples to a JSON-lines file for offline analysis (None turns logging off)
+def set_log_path(path):
+    global _log_file, _log_path
+    with _lock:
+        if _log_file is not None:
+            _log_file.close()
+        _log_file = None
+        _log_path = path
+
+
+def _write_log(name, ms, fields):
+    global _log_file
+    if _log_file is None:
+        _log_file = open(_log_path, "a", buffering=1, encoding="utf-8")
+    entry = {"ts": round(time.time(), 3), "span": name, "ms": round(ms, 3),
+             "thread": threading.current_thread().name}
+    entry.update(fields)
+    _log_file.write(json.dumps(entry) + "\n")
+
+
+# Record one sample of a named span, in milliseconds
+def record(name, ms, **fields):
+    with _lock:
+        samples = _samples.get(name)
+        if samples is None:
+            samples = _samples[name] = deque(maxlen=SAMPLES_PER_SPAN)
+        samples.append(ms)
+        _counts[name] = _counts.get(name, 0) + 1
+        _totals[name] = _totals.get(name, 0.0) + ms
+        if _log_path:
+            _write_log(name, ms, fields)
+
+
+# Time a block: with span("db.products_page"): ...
+@contextmanager
+def span(name, **fields):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, (time.perf_counter() - started) * 1000, **fields)
+
+
+# Decorator timing every call of a function under the given span name
+def timed(name):
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name, (time.perf_counter() - started) * 1000)
+        return wrapper
+    return decorate
+
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+# Latency summary per span, slowest total first; percentiles cover the most recent samples
+def summary():
+    with _lock:
+        snapshot = {name: sorted(samples) for name, samples in _samples.items()}
+        counts = dict(_counts)
+        totals = dict(_totals)
+    rows = []
+    for name, ordered in snapshot.items():
+        if not ordered:
+            continue
+        rows.append({
+            "span": name,
+            "count": counts[name],
+            "total_ms": round(totals[name], 1),
+            "p50_ms": round(_percentile(ordered, 0.50), 3),
+            "p95_ms": round(_percentile(ordered, 0.95), 3),
+            "p99_ms": round(_percentile(ordered, 0.99), 3),
+            "max_ms": round(ordered[-1], 3),
+        })
+    rows.sort(key=lambda row: row["total_ms"], reverse=True)
+    return rows
+
+
+def reset():
+    with _lock:
+        _samples.clear()
+        _counts.clear()
+        _totals.clear()
@@ -0,0 +1,258 @@
+import threading
+import time
+from collections import OrderedDict
+from db_init import after_commit
+from perf import timed
+
+PRODUCT_COLUMNS = "id, name, price, available, image_key, description, color, size"
+
+# Page sizes offered on the Main Page grid (multiples of the 3-column layout)
+PAGE_SIZE_OPTIONS = [9, 18, 36, 72]
+DEFAULT_PAGE_SIZE = 18
+
+# Most distinct catalog queries kept for the current version
+CATALOG_CACHE_ENTRIES = 256
+# How often the persisted version is re-read to notice writes from other processes
+VERSION_REFRESH_SECONDS = 5.0
+
+_lock = threading.Lock()
+_cache = OrderedDict()
+_cache_version = None
+_version = None
+_version_checked_at = 0.0
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+# Create the single-row table holding the catalog version counter
+def init_catalog_meta(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_meta (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    # Checked first so the per-rerun setup stays read-only once the row exists
+    if conn.execute("SELECT 1 FROM catalog_meta WHERE id = 1").fetchone() is None:
+        conn.execute("INSERT INTO catalog_meta (id, version) VALUES (1, 0)")
+
+
+# Current catalog version; only touches SQLite every VERSION_REFRESH_SECONDS
+def get_catalog_version(conn):
+    global _version, _version_checked_at
+    now = time.monotonic()
+    if _version is None or now - _version_checked_at >= VERSION_REFRESH_SECONDS:
+        row = conn.execute("SELECT version FROM catalog_meta WHERE id = 1").fetchone()
+        with _lock:
+            # Never step back if a local commit landed while this read was in flight
+            _version = max(row[0] if row else 0, _version or 0)
+            _version_checked_at = now
+    return _version
+
+
+def _set_version(version):
+    global _version, _version_checked_at
+    with _lock:
+        _version = version
+        _version_checked_at = time.monotonic()
+        _cache.clear()
+        _stats["invalidations"] += 1
+
+
+# Call inside every write transaction; the cache is invalidated as soon as it commits
+def bump_catalog_version(conn):
+    conn.execute("UPDATE catalog_meta SET version = version + 1 WHERE id = 1")
+    version = conn.execute("SELECT version FROM catalog_meta WHERE id = 1").fetchone()[0]
+    after_commit(conn, lambda: _set_version(version))
+    return version
+
+
+# Run a catalog query through the shared cache for the current version
+def cached_query(conn, key, query):
+    global _cache_version
+    version = get_catalog_version(conn)
+    with _lock:
+        if _cache_version != version:
+            _cache.clear()
+            _cache_version = version
+        if key in _cache:
+            _cache.move_to_end(key)
+            _stats["hits"] += 1
+            return _cache[key]
+        _stats["misses"] += 1
+    result = query()
+    with _lock:
+        if _cache_version == version:
+            _cache[key] = result
+            while len(_cache) > CATALOG_CACHE_ENTRIES:
+                _cache.popitem(last=False)
+    return result
+
+
+# Forget the cached version and every cached query (e.g. after switching databases)
+def reset_catalog_cache():
+    global _version, _cache_version
+    with _lock:
+        _cache.clear()
+        _version = None
+        _cache_version = None
+
+
+def catalog_cache_stats():
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            "version": _version,
+            "entries": len(_cache),
+            "hits": _stats["hits"],
+            "misses": _stats["misses"],
+            "invalidations": _stats["invalidations"],
+            "hit_rate": _stats["hits"] / lookups if lookups else 0.0,
+        }
+
+
+# Orderings offered on the Main Page; every one ends in id so keyset cursors are unique
+SORT_ORDERS = {
+    "default": "id",
+    "price_asc": "price, id",
+    "price_desc": "price DESC, id DESC",
+}
+
+FACETS = ("available", "color", "size")
+
+
+# Create the indexes behind the filter sidebar and price sorting; safe to rerun
+def init_catalog_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_products_available_price ON products (available, price)")
+    # Unfiltered price sorts; the index ends in rowid, so it delivers (price, id) order for the keyset cursor
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_products_price ON products (price)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_products_color ON products (color)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_products_size ON products (size)")
+
+
+# Add the products.sku column used by bulk imports to match existing products
+def init_product_sku(conn):
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(products)")]
+    if "sku" not in columns:
+        conn.execute("ALTER TABLE products ADD COLUMN sku TEXT")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_products_sku ON products (sku)")
+
+
+# Compile filter criteria into WHERE clauses and parameters
+# filters: {"in_stock": bool, "min_price": float, "max_price": float, "colors": [...], "sizes": [...]}
+# skip leaves out one facet's own criterion so its counts show every choice
+def build_filter_clause(filters, alias="", skip=None):
+    clauses, params = [], []
+    if not filters:
+        return clauses, params
+    if filters.get("in_stock") and skip != "available":
+        clauses.append(f"{alias}available = 1")
+    if filters.get("min_price") is not None:
+        clauses.append(f"{alias}price >= ?")
+        params.append(filters["min_price"])
+    if filters.get("max_price") is not None:
+        clauses.append(f"{alias}price <= ?")
+        params.append(filters["max_price"])
+    for facet, column in (("color", "colors"), ("size", "sizes")):
+        values = filters.get(column)
+        if values and skip != facet:
+            clauses.append(f"{alias}{facet} IN ({', '.join('?' for _ in values)})")
+            params.extend(values)
+    return clauses, params
+
+
+def _where(clauses):
+    return f" WHERE {' AND '.join(clauses)}" if clauses else ""
+
+
+# Hashable form of the filter criteria for cache keys
+def filters_key(filters):
+    if not filters:
+        return ()
+    return tuple(sorted((k, tuple(v) if isinstance(v, (list, tuple)) else v) for k, v in filters.items()))
+
+
+# Cursor pointing just after a row under the given ordering
+def row_cursor(row, sort="default"):
+    return row[0] if sort == "default" else (row[2], row[0])
+
+
+# Reject a cursor made under another ordering: an id for "default", a (price, id) pair for the price sorts
+def check_cursor(after, sort):
+    if sort == "default":
+        valid = isinstance(after, int) and not isinstance(after, bool)
+    else:
+        valid = isinstance(after, tuple) and len(after) == 2
+    if not valid:
+        raise ValueError(f"cursor {after!r} does not fit sort order {sort!r}")
+
+
+# Fetch one page of products after the given cursor (keyset pagination)
+# Returns (rows, next_cursor); next_cursor is None on the last page
+@timed("db.fetch_products_page")
+def fetch_products_page(conn, after=None, limit=DEFAULT_PAGE_SIZE, filters=None, sort="default"):
+    clauses, params = build_filter_clause(filters)
+    if after is not None:
+        check_cursor(after, sort)
+        if sort == "price_asc":
+            clauses.append("(price, id) > (?, ?)")
+            params.extend(after)
+        elif sort == "price_desc":
+            clauses.append("(price, id) < (?, ?)")
+            params.extend(after)
+        else:
+            clauses.append("id > ?")
+            params.append(after)
+    rows = conn.execute(
+        f"SELECT {PRODUCT_COLUMNS} FROM products{_where(clauses)} ORDER BY {SORT_ORDERS[sort]} LIMIT ?",
+        params + [limit + 1]
+    ).fetchall()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, row_cursor(rows[-1], sort)
+    return rows, None
+
+
+def get_products_page(conn, after=None, limit=DEFAULT_PAGE_SIZE, filters=None, sort="default"):
+    return cached_query(conn, ("page", after, limit, filters_key(filters), sort),
+                        lambda: fetch_products_page(conn, after, limit, filters, sort))
+
+
+# Counts per availability, color and size in one UNION ALL of GROUP BYs;
+# each facet applies every criterion except its own
+@timed("db.fetch_facet_counts")
+def fetch_facet_counts(conn, filters=None):
+    parts, params = [], []
+    for facet in FACETS:
+        clauses, facet_params = build_filter_clause(filters, skip=facet)
+        parts.append(f"SELECT '{facet}', {facet}, COUNT(*) FROM products{_where(clauses)} GROUP BY {facet}")
+        params.extend(facet_params)
+    counts = {facet: {} for facet in FACETS}
+    for facet, value, count in conn.execute(" UNION ALL ".join(parts), params):
+        if value is not None and value != "":
+            counts[facet][value] = count
+    return counts
+
+
+def get_facet_counts(conn, filters=None):
+    return cached_query(conn, ("facets", filters_key(filters)),
+                        lambda: fetch_facet_counts(conn, filters))
+
+
+# Id, name, price and availability of every product for the admin table
+@timed("db.fetch_product_summaries")
+def fetch_product_summaries(conn):
+    return conn.execute("SELECT id, name, price, available FROM products").fetchall()
+
+
+def get_product_summaries(conn):
+    return cached_query(conn, ("summaries",), lambda: fetch_product_summaries(conn))
+
+
+# One product by id, or None
+@timed("db.fetch_product")
+def fetch_product(conn, product_id):
+    return conn.execute(f"SELECT {PRODUCT_COLUMNS} FROM products WHERE id = ?", (product_id,)).fetchone()
+
+
+def get_product(conn, product_id):
+    return cached_query(conn, ("product", product_id), lambda: fetch_product(conn, product_id))
@@ -0,0 +1,95 @@
+import re
+from perf import timed
+from product_management import (
+    PRODUCT_COLUMNS, DEFAULT_PAGE_SIZE, SORT_ORDERS, cached_query, build_filter_clause, filters_key
+)
+
+# Relative weight of each indexed column in the bm25 ranking (name, description, color, size)
+BM25_WEIGHTS = (10.0, 1.0, 2.0, 2.0)
+
+_TRIGGERS = [
+    '''
+    CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts (rowid, name, description, color, size)
+        VALUES (new.id, new.name, new.description, new.color, new.size);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts (products_fts, rowid, name, description, color, size)
+        VALUES ('delete', old.id, old.name, old.description, old.color, old.size);
+    END
+    ''',
+    # Only re-index when a searchable column changes, not on image or price edits
+    '''
+    CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE OF name, description, color, size ON products BEGIN
+        INSERT INTO products_fts (products_fts, rowid, name, description, color, size)
+        VALUES ('delete', old.id, old.name, old.description, old.color, old.size);
+        INSERT INTO products_fts (rowid, name, description, color, size)
+        VALUES (new.id, new.name, new.description, new.color, new.size);
+    END
+    ''',
+]
+
+
+# Create the FTS5 index over the products table and the triggers keeping it in sync
+def init_search_index(conn):
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'"
+    ).fetchone()
+    if exists:
+        return
+    conn.execute('''
+        CREATE VIRTUAL TABLE products_fts USING fts5(
+            name, description, color, size,
+            content='products', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    ''')
+    for trigger in _TRIGGERS:
+        conn.execute(trigger)
+    # Index the products that already exist
+    conn.execute("INSERT INTO products_fts (products_fts) VALUES ('rebuild')")
+
+
+# Turn free text into an FTS5 query: every word must match, the last one may be a prefix
+def build_match_query(text):
+    words = re.findall(r"\w+", text or "")
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words[:-1]]
+    terms.append(f'"{words[-1]}"*')
+    return " ".join(terms)
+
+
+# Fetch one page of results matching the filters; returns (rows, has_more)
+# Results are bm25-ranked unless a price ordering is requested
+@timed("db.search_products")
+def search_products(conn, text, page=0, limit=DEFAULT_PAGE_SIZE, filters=None, sort="default"):
+    match = build_match_query(text)
+    if match is None:
+        return [], False
+    columns = ", ".join(f"p.{column.strip()}" for column in PRODUCT_COLUMNS.split(","))
+    clauses, params = build_filter_clause(filters, alias="p.")
+    if sort == "default":
+        order = f"bm25(products_fts, {', '.join(str(weight) for weight in BM25_WEIGHTS)})"
+    else:
+        order = ", ".join(f"p.{term.strip()}" for term in SORT_ORDERS[sort].split(","))
+    rows = conn.execute(
+        f'''
+        SELECT {columns}
+        FROM products_fts
+        JOIN products p ON p.id = products_fts.rowid
+        WHERE {" AND ".join(["products_fts MATCH ?"] + clauses)}
+        ORDER BY {order}
+        LIMIT ? OFFSET ?
+        ''',
+        [match] + params + [limit + 1, page * limit]
+    ).fetchall()
+    return rows[:limit], len(rows) > limit
+
+
+def get_search_page(conn, text, page=0, limit=DEFAULT_PAGE_SIZE, filters=None, sort="default"):
+    return cached_query(conn, ("search", build_match_query(text), page, limit, filters_key(filters), sort),
+                        lambda: search_products(conn, text, page, limit, filters, sort))
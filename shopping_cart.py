@@ -1,23 +1,28 @@
 import streamlit as st
+from db_init import get_connection, PRODUCTS_DB
+from cart_management import init_cart, add_to_cart as add_cart_item, get_cart_lines, clear_cart, prune_cart
+from order_management import checkout
 
-def init_cart():
-    if 'cart' not in st.session_state:
-        st.session_state.cart = []
-
-def add_to_cart(product_id, name, price):
-    st.session_state.cart.append({"id": product_id, "name": name, "price": price})
+def add_to_cart(product_id, name, quantity=1):
+    add_cart_item(product_id, quantity)
     st.success(f"Added {name} to cart")
 
 def view_cart():
     st.sidebar.title("Shopping Cart")
-    if 'cart' in st.session_state and st.session_state.cart:
-        total = 0
-        for item in st.session_state.cart:
-            st.sidebar.write(f"{item['name']} - {item['price']} ₮")
-            total += item['price']
+    init_cart()
+    conn = get_connection(PRODUCTS_DB)
+    prune_cart(conn)
+    lines, total = get_cart_lines(conn, st.session_state.cart)
+    if lines:
+        for product_id, name, price, quantity, image_key, available in lines:
+            st.sidebar.write(f"{name} × {quantity} - {price * quantity} ₮")
         st.sidebar.write(f"**Total: {total} ₮**")
         if st.sidebar.button("Checkout"):
-            st.sidebar.success("Checkout successful!")
-            st.session_state.cart = []
+            order_id, problems = checkout(st.session_state.cart, st.session_state.get("username"))
+            if order_id:
+                st.sidebar.success(f"Order #{order_id} placed!")
+                clear_cart()
+            for problem in problems:
+                st.sidebar.error(problem)
     else:
         st.sidebar.write("Your cart is empty.")
@@ -1,22 +1,10 @@
 import streamlit as st
 import sqlite3
+from db_init import transaction, USERS_DB
+from migrations import migrate
 
-# Initialize the database connection
-def init_user_db():
-    conn = sqlite3.connect('users.db', check_same_thread=False)
-    c = conn.cursor()
-    c.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT NOT NULL UNIQUE,
-        password TEXT NOT NULL,
-        is_admin BOOLEAN NOT NULL DEFAULT 0
-    )
-    ''')
-    conn.commit()
-    return conn
-
-conn = init_user_db()
+# Make sure users.db is current once per process; queries use the calling thread's pooled connection
+migrate(USERS_DB)
 
 def sign_up():
     st.title("Sign Up")
@@ -25,10 +13,9 @@ def sign_up():
     confirm_password = st.text_input("Confirm Password", type="password", key="sign_up_confirm_password")
     if st.button("Sign Up", key="sign_up_button"):
         if username and password:
-            cursor = conn.cursor()
             try:
-                cursor.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password))
-                conn.commit()
+                with transaction(USERS_DB) as conn:
+                    conn.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password))
                 st.success("User registered successfully! Please log in.")
             except sqlite3.IntegrityError:
                 st.error("Username already exists. Please choose a different username.")
@@ -1,22 +1,11 @@
 import streamlit as st
 import sqlite3
+from db_init import get_connection, transaction, USERS_DB
+from cart_management import restore_cart, clear_cart
+from migrations import migrate
 
-# Initialize the database connection
-def init_user_db():
-    conn = sqlite3.connect('users.db', check_same_thread=False)
-    c = conn.cursor()
-    c.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT NOT NULL UNIQUE,
-        password TEXT NOT NULL,
-        is_admin BOOLEAN NOT NULL DEFAULT 0
-    )
-    ''')
-    conn.commit()
-    return conn
-
-conn = init_user_db()
+# Make sure users.db is current once per process; queries use the calling thread's pooled connection
+migrate(USERS_DB)
 
 def login():
     if 'user_logged_in' not in st.session_state:
@@ -32,13 +21,14 @@ def login():
         username = st.sidebar.text_input("Username")
         password = st.sidebar.text_input("Password", type="password")
         if st.sidebar.button("Login"):
-            cursor = conn.cursor()
+            cursor = get_connection(USERS_DB).cursor()
             cursor.execute("SELECT id, username, password, is_admin FROM users WHERE username = ? AND password = ?", (username, password))
             user = cursor.fetchone()
             if user:
                 st.session_state.user_logged_in = True
                 st.session_state.username = username
                 st.session_state.is_admin = user[3]  # Set to True for admin, False for regular user
+                restore_cart(username)
                 st.sidebar.success(f"Logged in as {username}")
                 if st.session_state.is_admin:
                     st.sidebar.info("Admin Console")
@@ -53,10 +43,9 @@ def sign_up():
     confirm_password = st.text_input("Confirm Password", type="password", key="sign_up_confirm_password")
     if st.button("Sign Up", key="sign_up_button"):
         if username and password:
-            cursor = conn.cursor()
             try:
-                cursor.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password))
-                conn.commit()
+                with transaction(USERS_DB) as conn:
+                    conn.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password))
                 st.success("User registered successfully! Please log in.")
             except sqlite3.IntegrityError:
                 st.error("Username already exists. Please choose a different username.")
@@ -68,4 +57,6 @@ def logout():
     if st.sidebar.button("Logout"):
         st.session_state.user_logged_in = False
         st.session_state.is_admin = False
+        # The cart stays saved for the user's next login
+        clear_cart()
         st.sidebar.success("Logged out successfully!")
@@ -0,0 +1,139 @@
+import argparse
+import io
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from PIL import Image
+from db_init import get_connection, transaction, close_all, PRODUCTS_DB
+from image_store import build_variants, store_variants, load_image, FULL_SIZE
+from init_db import initialize_db
+from job_queue import (
+    claim_jobs, requeue_stale, complete_job, fail_job, enqueue, worker_name,
+    PRODUCT_IMAGE, REENCODE_IMAGE, REENCODE_CATALOG
+)
+from product_management import bump_catalog_version
+
+
+# Runs in a pool process: decode an image and encode all of its variants
+def build_variants_from_bytes(data):
+    return build_variants(Image.open(io.BytesIO(data)))
+
+
+# Turn a catalog re-encode request into one job per product that has an image
+def expand_catalog_job(job_id):
+    with transaction(PRODUCTS_DB) as conn:
+        product_ids = [row[0] for row in conn.execute(
+            "SELECT id FROM products WHERE image_key IS NOT NULL ORDER BY id")]
+        for product_id in product_ids:
+            enqueue(conn, REENCODE_IMAGE, product_id)
+        complete_job(conn, job_id)
+    print(f"Job {job_id}: queued re-encoding of {len(product_ids)} product image(s)")
+
+
+# Source of an image job as (bytes, key): the upload itself with no key, or the product's largest
+# stored JPEG and the image key it was read from
+def job_source(conn, kind, product_id, payload):
+    if kind == PRODUCT_IMAGE:
+        return payload, None
+    row = conn.execute("SELECT image_key FROM products WHERE id = ?", (product_id,)).fetchone()
+    if not row or not row[0]:
+        return None, None
+    return load_image(conn, row[0], FULL_SIZE[0]), row[0]
+
+
+# Store the variants and point the product at them, in one transaction with the job's completion.
+# Jobs finish in any order, so a result is dropped when the product has moved on since the job
+# started: a re-encode only replaces the image it was made from, and an upload never replaces a
+# newer upload that is already done. Returns whether the product was updated
+def finish_image_job(job_id, kind, product_id, source_key, key, variants):
+    with transaction(PRODUCTS_DB) as conn:
+        if kind == REENCODE_IMAGE:
+            applied = conn.execute("UPDATE products SET image_key = ? WHERE id = ? AND image_key = ?",
+                                   (key, product_id, source_key)).rowcount > 0
+        else:
+            newer = conn.execute(
+                "SELECT 1 FROM jobs WHERE product_id = ? AND kind = ? AND id > ? AND status = 'done' LIMIT 1",
+                (product_id, PRODUCT_IMAGE, job_id)
+            ).fetchone()
+            applied = newer is None and conn.execute("UPDATE products SET image_key = ? WHERE id = ?",
+                                                     (key, product_id)).rowcount > 0
+        if applied:
+            store_variants(conn, key, variants)
+            bump_catalog_version(conn)
+        complete_job(conn, job_id)
+    return applied
+
+
+# Claim a batch of jobs and run their image work in the pool; returns the number of jobs handled
+def process_batch(pool, worker, batch_size):
+    with transaction(PRODUCTS_DB) as conn:
+        requeue_stale(conn)
+        jobs = claim_jobs(conn, worker, batch_size)
+    if not jobs:
+        return 0
+
+    conn = get_connection(PRODUCTS_DB)
+    futures = {}
+    for job_id, kind, product_id, payload, attempts in jobs:
+        try:
+            if kind == REENCODE_CATALOG:
+                expand_catalog_job(job_id)
+                continue
+            if kind not in (PRODUCT_IMAGE, REENCODE_IMAGE):
+                raise ValueError(f"unknown job kind {kind!r}")
+            source, source_key = job_source(conn, kind, product_id, payload)
+            if source is None:
+                raise ValueError(f"no image to process for product {product_id}")
+        except Exception as e:
+            with transaction(PRODUCTS_DB) as write:
+                fail_job(write, job_id, attempts, e)
+            continue
+        futures[pool.submit(build_variants_from_bytes, source)] = (job_id, kind, product_id, source_key, attempts)
+
+    for future in as_completed(futures):
+        job_id, kind, product_id, source_key, attempts = futures[future]
+        try:
+            key, variants = future.result()
+            applied = finish_image_job(job_id, kind, product_id, source_key, key, variants)
+        except Exception as e:
+            with transaction(PRODUCTS_DB) as write:
+                fail_job(write, job_id, attempts, e)
+            print(f"Job {job_id} failed: {e}", file=sys.stderr)
+        else:
+            if applied:
+                print(f"Job {job_id}: product {product_id} image ready")
+            else:
+                print(f"Job {job_id}: product {product_id} image changed meanwhile, result dropped")
+    return len(jobs)
+
+
+def run_worker(processes=None, batch_size=8, poll_interval=1.0, once=False):
+    initialize_db()
+    worker = worker_name()
+    print(f"Worker {worker} started")
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        while True:
+            handled = process_batch(pool, worker, batch_size)
+            if handled:
+                continue
+            if once:
+                break
+            time.sleep(poll_interval)
+    close_all()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Process queued image jobs from products.db.")
+    parser.add_argument("--processes", type=int, default=None, help="image processes (default: one per CPU)")
+    parser.add_argument("--batch", type=int, default=8, help="jobs claimed at a time")
+    parser.add_argument("--poll", type=float, default=1.0, help="seconds to wait when the queue is empty")
+    parser.add_argument("--once", action="store_true", help="exit when the queue is empty")
+    args = parser.parse_args(argv)
+    try:
+        run_worker(args.processes, args.batch, args.poll, args.once)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()